@@ -1,63 +1,1278 @@
 import os
+import math
+import mmap
+import time
+import fcntl
+import heapq
+import queue
+import secrets
+from collections import deque
+import hmac
 import hashlib
 import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager, nullcontext
 from pathlib import Path
-from typing import List, Set
+from typing import Callable, ContextManager, Dict, List, Optional, Tuple
+import json
 import logging
-from flask import Flask, render_template, request, jsonify
+import numpy as np
+from flask import Flask, Response, g, has_request_context, render_template, request, jsonify, stream_with_context
 from dotenv import load_dotenv
 
+# prometheus_client picks its value class from PROMETHEUS_MULTIPROC_DIR when it is imported,
+# so .env has to be loaded before it
 load_dotenv()
 
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+from seed_ring import SeedRing
+
 app = Flask(__name__)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-RANDOMNESS_SOURCE = Path("/randomness-source")
+RANDOMNESS_SOURCE = Path(os.getenv("RANDOMNESS_SOURCE", "/randomness-source"))
 APP_PORT = int(os.getenv("APP_PORT", "5000"))
 SPECIAL_CHARS = os.getenv("SPECIAL_CHARS", "!@#$%^&*()_+-=[]{}|;:,.<>?")
 MAX_STRING_LENGTH = int(os.getenv("MAX_STRING_LENGTH", "256"))
 MAX_STRINGS_PER_REQUEST = int(os.getenv("MAX_STRINGS_PER_REQUEST", "10"))
+SNAPSHOT_RESCAN_INTERVAL = int(os.getenv("SNAPSHOT_RESCAN_INTERVAL", "60"))
+CLAIM_DIR_NAME = ".claimed"
+ENTROPY_SOURCE = os.getenv("ENTROPY_SOURCE", "snapshots")  # snapshots | seeds
+SEED_RING_PATH = Path(os.getenv("SEED_RING_PATH", str(RANDOMNESS_SOURCE / ".seeds")))
+ENTROPY_MODE = os.getenv("ENTROPY_MODE", "direct")  # direct | reservoir
+SNAPSHOT_ENTROPY_BITS = int(os.getenv("SNAPSHOT_ENTROPY_BITS", "128"))
+DRBG_RESEED_BYTES = int(os.getenv("DRBG_RESEED_BYTES", "1048576"))
+DRBG_RESEED_REQUESTS = int(os.getenv("DRBG_RESEED_REQUESTS", "1000"))
+DEFAULT_WORDLIST = Path(__file__).parent / "wordlist.txt"
+WORDLISTS = os.getenv("WORDLISTS", f"default={DEFAULT_WORDLIST}")  # name=path,name=path
+WORDLIST_RELOAD_INTERVAL = int(os.getenv("WORDLIST_RELOAD_INTERVAL", "30"))
+MAX_BULK_COUNT = int(os.getenv("MAX_BULK_COUNT", "10000"))
+# The capture service's pool size and the number of web workers, for sizing what is drawn ahead of demand
+MAX_SNAPSHOTS = int(os.getenv("MAX_SNAPSHOTS", "100"))
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+# By default the workers together draw at most a quarter of the pool ahead of demand
+PREGENERATE_BUDGET = max(1, MAX_SNAPSHOTS // (4 * WEB_WORKERS))
+PREFETCH_DEPTH = int(os.getenv("PREFETCH_DEPTH", str(min(8, PREGENERATE_BUDGET // 4))))  # 0 disables prefetching
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "1"))
+PREFETCH_WAIT = float(os.getenv("PREFETCH_WAIT", "1.0"))
+SNAPSHOT_READ_WORKERS = int(os.getenv("SNAPSHOT_READ_WORKERS", "4"))
+# In direct mode one queued string plus one passphrase cost under a snapshot; the reservoir makes them nearly free
+TOKEN_QUEUE_DEPTH = int(os.getenv("TOKEN_QUEUE_DEPTH", str(
+    64 if ENTROPY_MODE == "reservoir" else min(64, max(0, PREGENERATE_BUDGET - PREFETCH_DEPTH))
+)))  # 0 disables the token queues
+TOKEN_QUEUE_LOW_WATER = int(os.getenv("TOKEN_QUEUE_LOW_WATER", str(TOKEN_QUEUE_DEPTH // 4)))
+TOKEN_QUEUE_BATCH = 32
+# Seconds single requests wait to share one seed with others arriving alongside (0 disables)
+COALESCE_WINDOW = float(os.getenv("COALESCE_WINDOW", "0"))
+COALESCE_MAX_BATCH = int(os.getenv("COALESCE_MAX_BATCH", "64"))
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true").lower() in ("1", "true", "yes", "on")
+ADMISSION_CLIENT_RATE = float(os.getenv("ADMISSION_CLIENT_RATE", "1.0"))  # snapshots per second per client
+ADMISSION_CLIENT_BURST = float(os.getenv("ADMISSION_CLIENT_BURST", "120"))
+ADMISSION_CLIENT_WEIGHTS = os.getenv("ADMISSION_CLIENT_WEIGHTS", "")  # client=weight,client=weight
+ADMISSION_CLIENT_HEADER = os.getenv("ADMISSION_CLIENT_HEADER", "")  # e.g. X-Forwarded-For behind a proxy
+ADMISSION_SLOTS = int(os.getenv("ADMISSION_SLOTS", "2"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "64"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+ADMISSION_MAX_RETRY_AFTER = 300
+# Shape of /api/string, /api/passphrase and the matching pages
+FIXED_STRING_LENGTH = 32
+FIXED_STRING_CHAR_TYPES = ['uppercase', 'lowercase', 'numbers']
+FIXED_PASSPHRASE_WORDS = 3
+SNAPSHOT_READ_CHUNK = 256 * 1024
+DIGEST_SIZE = hashlib.sha256().digest_size
+BULK_BLOCK_SIZE = 256
+HEALTH_STREAM_MAX_CLIENTS = int(os.getenv("HEALTH_STREAM_MAX_CLIENTS", "4"))  # per worker
+HEALTH_STREAM_MAX_AGE = int(os.getenv("HEALTH_STREAM_MAX_AGE", "300"))
+HEALTH_PUSH_INTERVAL = 0.25
+HEALTH_KEEPALIVE_INTERVAL = 15
+# Set to a shared directory to aggregate metrics across gunicorn workers
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+DEPLETION_SAMPLE_INTERVAL = int(os.getenv("DEPLETION_SAMPLE_INTERVAL", "10"))
+
+REQUEST_LATENCY = Histogram("random_request_duration_seconds",
+                            "Request latency by route (time to first byte for streamed responses)",
+                            ["endpoint", "method", "status"])
+LOCK_WAIT = Histogram("random_generator_lock_wait_seconds", "Time spent waiting for the generator lock",
+                      buckets=(.0001, .0005, .001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5))
+SNAPSHOT_OPERATION = Histogram("random_snapshot_operation_seconds", "Snapshot read, hash and unlink durations",
+                               ["operation"], buckets=(.0001, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, 1))
+SNAPSHOTS_CONSUMED = Counter("random_snapshots_consumed", "Snapshots consumed by request type", ["request_type"])
+ENTROPY_BYTES = Counter("random_entropy_bytes", "Entropy bytes drawn by request type", ["request_type"])
+SAMPLING_REJECTIONS = Counter("random_sampling_rejections", "Rejected samples that needed a retry", ["method"])
+TOKEN_QUEUE_LEVEL = Gauge("random_token_queue_level", "Ready values in the token queue", ["profile"],
+                          multiprocess_mode="livesum")
+TOKEN_QUEUE_MISSES = Counter("random_token_queue_misses", "Requests generated synchronously because the queue was empty",
+                             ["profile"])
+COALESCED_BATCH = Histogram("random_coalesced_batch_size", "Requests served from one coalesced seed",
+                            buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+ADMISSION_REJECTIONS = Counter("random_admission_rejections", "Requests turned away by admission control", ["reason"])
+ADMISSION_QUEUE_WAIT = Histogram("random_admission_queue_wait_seconds", "Time spent in the fair queue before running")
+POOL_INFLOW_RATE = Gauge("random_pool_inflow_rate_per_second", "Rate new snapshots or seeds arrive at",
+                         multiprocess_mode="max")
+POOL_LEVEL = Gauge("random_pool_level", "Snapshots or seeds available", multiprocess_mode="max")
+DEPLETION_RATE = Gauge("random_pool_depletion_rate_per_second",
+                       "Net rate the pool is shrinking at (negative while it grows)", multiprocess_mode="max")
+TIME_TO_EMPTY = Gauge("random_pool_time_to_empty_seconds",
+                      "Projected time until the pool is empty at the current depletion rate", multiprocess_mode="min")
+
+class EntropyExhaustedError(Exception):
+    """Raised when no snapshot is left to draw entropy from."""
+
+class _SnapshotEventHandler(FileSystemEventHandler):
+    """Forward filesystem notifications for the randomness source to the index."""
+
+    def __init__(self, index: "SnapshotIndex"):
+        super().__init__()
+        self.index = index
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.index.add(Path(event.src_path))
+
+    def on_closed(self, event):
+        # Fired once the capture service has finished writing the file
+        if not event.is_directory:
+            self.index.add(Path(event.src_path))
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.index.discard(Path(event.src_path).name)
+            self.index.add(Path(event.dest_path))
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self.index.discard(Path(event.src_path).name)
+
+def _is_snapshot_name(name: str) -> bool:
+    """Hidden files (claims, temporary writes, seed rings) are never snapshots."""
+    return not name.startswith('.')
+
+# Endpoint name used to attribute entropy use outside a Flask request (the async server sets it)
+current_request_type: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_request_type", default=None)
+
+class ChangeNotifier:
+    """Version counter that lets any number of threads wait for the next change."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.version = 0
+
+    def notify(self):
+        with self._cond:
+            self.version += 1
+            self._cond.notify_all()
+
+    def wait(self, version: int, timeout: float) -> int:
+        """Wait until the version moves past the given one or the timeout expires; returns the current version."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+class SnapshotIndex:
+    """
+    In-memory index of available snapshots, ordered oldest first.
+    Built once with a directory scan, then kept current by inotify events,
+    with a periodic rescan as a fallback for missed notifications.
+    
+    Snapshots are claimed by renaming them into a claim directory, which is
+    atomic across processes: when several workers race for the same file
+    exactly one rename succeeds. Claims are prefixed with a random owner
+    token whose lock file the process holds a flock on for its lifetime, so
+    claims of dead processes are recognised even after their PID is reused.
+    """
+
+    def __init__(self, directory: Path, rescan_interval: int, changes: Optional[ChangeNotifier] = None):
+        self.directory = directory
+        self.rescan_interval = rescan_interval
+        self.claim_dir = directory / CLAIM_DIR_NAME
+        self._owner: Optional[str] = None
+        self._owner_pid: Optional[int] = None
+        self._owner_fd: Optional[int] = None
+        self._lock = threading.Lock()
+        self._heap: List[Tuple[int, str]] = []
+        self._entries: Dict[str, int] = {}
+        self._observer = None
+        # Snapshots claimed by this process and not yet released
+        self.claimed = 0
+        # Snapshots ever seen arriving, for the inflow rate
+        self.added_total = 0
+        # Set whenever snapshots are added, so waiting consumers can wake up
+        self.added = threading.Event()
+        self.changes = changes if changes is not None else ChangeNotifier()
+
+    def start(self):
+        """Build the index and start watching the directory."""
+        self.release_stale_claims()
+        self.rescan()
+        self._start_observer()
+        thread = threading.Thread(target=self._rescan_loop, name="snapshot-rescan", daemon=True)
+        thread.start()
+
+    def _start_observer(self):
+        """Start the inotify watcher once the directory exists."""
+        if self._observer is not None or not self.directory.exists():
+            return
+        try:
+            observer = Observer()
+            observer.schedule(_SnapshotEventHandler(self), str(self.directory), recursive=False)
+            observer.daemon = True
+            observer.start()
+            self._observer = observer
+            logger.info(f"Watching {self.directory} for new snapshots")
+        except Exception as e:
+            logger.error(f"Failed to watch {self.directory}, relying on periodic rescans: {e}")
+
+    def _rescan_loop(self):
+        while True:
+            time.sleep(self.rescan_interval)
+            try:
+                self._start_observer()
+                self.rescan()
+            except Exception as e:
+                logger.error(f"Error rescanning snapshots: {e}")
+
+    def rescan(self):
+        """Rebuild the index from a full directory scan."""
+        entries: Dict[str, int] = {}
+        if self.directory.exists():
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    try:
+                        if _is_snapshot_name(entry.name) and entry.is_file():
+                            entries[entry.name] = entry.stat().st_mtime_ns
+                    except FileNotFoundError:
+                        continue
+        heap = [(mtime, name) for name, mtime in entries.items()]
+        heapq.heapify(heap)
+        with self._lock:
+            self.added_total += len(entries.keys() - self._entries.keys())
+            self._entries = entries
+            self._heap = heap
+        if entries:
+            self.added.set()
+        self.changes.notify()
+
+    def add(self, path: Path):
+        """Add or refresh a snapshot file."""
+        if path.parent != self.directory or not _is_snapshot_name(path.name):
+            return
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return
+        if not path.is_file():
+            return
+        with self._lock:
+            if self._entries.get(path.name) == stat.st_mtime_ns:
+                return
+            if path.name not in self._entries:
+                self.added_total += 1
+            self._entries[path.name] = stat.st_mtime_ns
+            heapq.heappush(self._heap, (stat.st_mtime_ns, path.name))
+        self.added.set()
+        self.changes.notify()
+
+    def discard(self, name: str):
+        """Forget a snapshot; its heap entry is dropped lazily."""
+        with self._lock:
+            removed = self._entries.pop(name, None) is not None
+            # Keep stale heap entries from piling up between rescans
+            if len(self._heap) > 2 * len(self._entries) + 64:
+                self._heap = [(mtime, n) for n, mtime in self._entries.items()]
+                heapq.heapify(self._heap)
+        if removed:
+            self.changes.notify()
+
+    def pop_oldest(self) -> Optional[Path]:
+        """Remove and return the oldest available snapshot, or None if empty."""
+        with self._lock:
+            path = None
+            while self._heap:
+                mtime, name = heapq.heappop(self._heap)
+                if self._entries.get(name) == mtime:
+                    del self._entries[name]
+                    path = self.directory / name
+                    break
+        if path is not None:
+            self.changes.notify()
+        return path
+
+    def _claim_owner(self) -> str:
+        """This process's owner token, created on first use (and again after a fork)."""
+        if self._owner_pid == os.getpid():
+            return self._owner
+        with self._lock:
+            if self._owner_pid != os.getpid():
+                self.claim_dir.mkdir(exist_ok=True)
+                owner = f"{os.getpid()}.{secrets.token_hex(8)}"
+                # Lock under a temporary name first, so no scan ever sees the lock file unlocked
+                pending = self.claim_dir / f".{owner}.lock"
+                fd = os.open(pending, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                os.rename(pending, self.claim_dir / f"{owner}.lock")
+                # A forked child must not keep its parent's lock alive
+                if self._owner_fd is not None:
+                    os.close(self._owner_fd)
+                self._owner, self._owner_fd, self._owner_pid = owner, fd, os.getpid()
+        return self._owner
+
+    def _owner_alive(self, owner: str) -> bool:
+        """Whether the process owning these claims still holds its lock file."""
+        if owner == self._owner and self._owner_pid == os.getpid():
+            return True
+        lock_path = self.claim_dir / f"{owner}.lock"
+        try:
+            fd = os.open(lock_path, os.O_RDWR)
+        except FileNotFoundError:
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        finally:
+            os.close(fd)
+        return False
+
+    def claim_oldest(self) -> Optional[Path]:
+        """
+        Claim the oldest snapshot for this process by renaming it into the
+        claim directory. Returns the claimed path, or None if nothing is left.
+        """
+        owner = self._claim_owner()
+        while True:
+            path = self.pop_oldest()
+            if path is None:
+                return None
+            claimed = self.claim_dir / f"{owner}-{path.name}"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                # Claimed by another worker or removed by the capture service
+                continue
+            with self._lock:
+                self.claimed += 1
+            return claimed
+
+    def release(self, claimed: Path):
+        """Delete a snapshot claimed by claim_oldest once it has been used."""
+        try:
+            claimed.unlink()
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.claimed -= 1
+
+    def release_stale_claims(self):
+        """Delete claims left behind by processes that died; they may have been read already."""
+        if not self.claim_dir.exists():
+            return
+        alive: Dict[str, bool] = {}
+        for path in self.claim_dir.iterdir():
+            if path.name.startswith('.') or path.name.endswith('.lock'):
+                continue
+            owner, _, _ = path.name.partition('-')
+            if owner not in alive:
+                alive[owner] = self._owner_alive(owner)
+            if not alive[owner]:
+                try:
+                    path.unlink()
+                    logger.warning(f"Removed stale claimed snapshot: {path.name}")
+                except FileNotFoundError:
+                    pass
+        for path in self.claim_dir.glob("*.lock"):
+            if not self._owner_alive(path.name[:-len(".lock")]):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class _WordlistData:
+    """Immutable view of one loaded wordlist: a private copy of the file plus word offsets."""
+
+    def __init__(self, buffer: mmap.mmap, starts: np.ndarray, ends: np.ndarray, mtime_ns: int, size: int):
+        self.buffer = buffer
+        self.starts = starts
+        self.ends = ends
+        self.mtime_ns = mtime_ns
+        self.size = size
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def word(self, index: int) -> str:
+        return self.buffer[self.starts[index]:self.ends[index]].decode('utf-8')
+
+class Wordlist:
+    """
+    Read-only wordlist copied once into an anonymous mmap plus two offset
+    arrays, so lookups are O(1) and large lists don't turn into millions of
+    Python strings. The copy is private, so the file can be edited or
+    rewritten in place; it is reloaded when its mtime or size changes.
+    """
+
+    def __init__(self, name: str, path: Path, reload_interval: int):
+        self.name = name
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._data: Optional[_WordlistData] = None
+        self._checked_at = 0.0
+        try:
+            self._data = self._load()
+        except Exception as e:
+            logger.error(f"Failed to load wordlist '{name}' from {path}: {e}")
+
+    def _load(self) -> _WordlistData:
+        with open(self.path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size == 0:
+                raise Exception("Empty wordlist")
+            # Mapping the file itself would SIGBUS if it were truncated or rewritten under us
+            buffer = mmap.mmap(-1, stat.st_size)
+            if f.readinto(buffer) != stat.st_size:
+                buffer.close()
+                raise Exception("Wordlist changed while loading")
+        
+        # Locate line boundaries in one vectorized pass, then trim whitespace
+        raw = np.frombuffer(buffer, dtype=np.uint8)
+        newlines = np.flatnonzero(raw == ord('\n'))
+        starts = np.concatenate(([0], newlines + 1))
+        ends = np.concatenate((newlines, [len(raw)]))
+        whitespace = np.zeros(256, dtype=bool)
+        whitespace[list(b' \t\r\v\f')] = True
+        while True:
+            trim = (ends > starts) & whitespace[raw[np.maximum(ends - 1, 0)]]
+            if not trim.any():
+                break
+            ends[trim] -= 1
+        while True:
+            trim = (ends > starts) & whitespace[raw[np.minimum(starts, len(raw) - 1)]]
+            if not trim.any():
+                break
+            starts[trim] += 1
+        keep = ends > starts
+        offset_type = np.uint32 if len(raw) < 2 ** 32 else np.uint64
+        starts = starts[keep].astype(offset_type)
+        ends = ends[keep].astype(offset_type)
+        del raw
+        
+        if len(starts) == 0:
+            raise Exception("Empty wordlist")
+        
+        logger.info(f"Loaded wordlist '{self.name}': {len(starts)} words from {self.path}")
+        return _WordlistData(buffer, starts, ends, stat.st_mtime_ns, stat.st_size)
+
+    def get(self) -> _WordlistData:
+        """Return the current wordlist, reloading it if the file changed."""
+        now = time.monotonic()
+        if self._data is not None and now - self._checked_at < self.reload_interval:
+            return self._data
+        
+        with self._lock:
+            if self._data is None or now - self._checked_at >= self.reload_interval:
+                self._checked_at = now
+                try:
+                    stat = self.path.stat()
+                    if (self._data is None or stat.st_mtime_ns != self._data.mtime_ns
+                            or stat.st_size != self._data.size):
+                        self._data = self._load()
+                except FileNotFoundError:
+                    if self._data is None:
+                        raise Exception("Wordlist file not found")
+                    logger.warning(f"Wordlist '{self.name}' file disappeared, keeping loaded copy")
+                except Exception as e:
+                    if self._data is None:
+                        raise
+                    logger.error(f"Failed to reload wordlist '{self.name}', keeping loaded copy: {e}")
+        return self._data
+
+def load_wordlists(spec: str) -> Dict[str, Wordlist]:
+    """Load the named wordlists given as 'name=path,name=path'."""
+    wordlists = {}
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, path = item.partition('=')
+        if not path:
+            name, path = "default", name
+        wordlists[name.strip()] = Wordlist(name.strip(), Path(path.strip()), WORDLIST_RELOAD_INTERVAL)
+    return wordlists
+
+class EntropyAccumulator:
+    """
+    Mixes snapshot digests into a running SHA-512 state and keeps a
+    conservative estimate of how much entropy has been collected.
+    """
+
+    def __init__(self):
+        self._state = hashlib.sha512()
+        self.entropy_bits = 0
+        self.inputs = 0
+
+    def add(self, data: bytes, entropy_bits: int):
+        """Mix in data credited with entropy_bits of entropy."""
+        self._state.update(len(data).to_bytes(4, 'big'))
+        self._state.update(data)
+        self.entropy_bits += min(entropy_bits, len(data) * 8)
+        self.inputs += 1
+
+    def extract(self) -> bytes:
+        """Return seed material and reset the entropy estimate."""
+        seed = self._state.digest()
+        self._state = hashlib.sha512(seed)
+        self.entropy_bits = 0
+        self.inputs = 0
+        return seed
+
+class HmacDrbg:
+    """HMAC_DRBG with SHA-256 as specified in NIST SP 800-90A."""
+
+    SECURITY_STRENGTH = 256
+    MAX_BYTES_PER_REQUEST = 65536
+
+    def __init__(self, seed_material: bytes):
+        self._key = b'\x00' * 32
+        self._value = b'\x01' * 32
+        self._update(seed_material)
+        self.reseed_counter = 1
+
+    def _hmac(self, data: bytes) -> bytes:
+        return hmac.new(self._key, data, hashlib.sha256).digest()
+
+    def _update(self, provided_data: bytes = b''):
+        self._key = self._hmac(self._value + b'\x00' + provided_data)
+        self._value = self._hmac(self._value)
+        if provided_data:
+            self._key = self._hmac(self._value + b'\x01' + provided_data)
+            self._value = self._hmac(self._value)
+
+    def reseed(self, seed_material: bytes):
+        self._update(seed_material)
+        self.reseed_counter = 1
+
+    def generate(self, num_bytes: int) -> bytes:
+        output = bytearray()
+        while len(output) < num_bytes:
+            # SP 800-90A caps a single generate call at 2^19 bits
+            chunk = min(num_bytes - len(output), self.MAX_BYTES_PER_REQUEST)
+            produced = 0
+            while produced < chunk:
+                self._value = self._hmac(self._value)
+                output += self._value
+                produced += len(self._value)
+            del output[len(output) - produced + chunk:]
+            self._update()
+            self.reseed_counter += 1
+        return bytes(output)
+
+class EntropyReservoir:
+    """
+    Serves entropy from an HMAC_DRBG seeded with conditioned snapshot digests,
+    so one snapshot can back many requests. The DRBG is reseeded from fresh
+    snapshots once its byte or request budget is spent.
+    """
+
+    def __init__(self, draw_digests: Callable[[int], List[bytes]], snapshot_entropy_bits: int,
+                 reseed_bytes: int, reseed_requests: int):
+        self.draw_digests = draw_digests
+        self.snapshot_entropy_bits = snapshot_entropy_bits
+        self.reseed_bytes = reseed_bytes
+        self.reseed_requests = reseed_requests
+        self.accumulator = EntropyAccumulator()
+        self.drbg: Optional[HmacDrbg] = None
+        self.bytes_since_reseed = 0
+        self.requests_since_reseed = 0
+        self.reseed_count = 0
+        # Requests finish outside the generator lock, so they are counted under their own
+        self._requests_lock = threading.Lock()
+
+    def _needs_reseed(self) -> bool:
+        return (self.drbg is None
+                or self.bytes_since_reseed >= self.reseed_bytes
+                or self.requests_since_reseed >= self.reseed_requests)
+
+    def _reseed(self):
+        # Partially collected entropy stays in the accumulator if the pool runs dry
+        while self.accumulator.entropy_bits < HmacDrbg.SECURITY_STRENGTH:
+            missing_bits = HmacDrbg.SECURITY_STRENGTH - self.accumulator.entropy_bits
+            for digest in self.draw_digests(-(-missing_bits // self.snapshot_entropy_bits)):
+                self.accumulator.add(digest, self.snapshot_entropy_bits)
+        snapshots_used = self.accumulator.inputs
+        seed_material = self.accumulator.extract()
+        if self.drbg is None:
+            self.drbg = HmacDrbg(seed_material)
+        else:
+            self.drbg.reseed(seed_material)
+        self.bytes_since_reseed = 0
+        self.requests_since_reseed = 0
+        self.reseed_count += 1
+        logger.info(f"Reseeded entropy reservoir from {snapshots_used} snapshots")
+
+    def read(self, num_bytes: int) -> bytes:
+        """Return num_bytes of DRBG output, reseeding first if the budget is spent."""
+        if self._needs_reseed():
+            self._reseed()
+        output = self.drbg.generate(num_bytes)
+        self.bytes_since_reseed += num_bytes
+        return output
+
+    def count_requests(self, count: int = 1):
+        """Count requests served, towards the reseed budget; readers refill in chunks, so reads are not requests."""
+        with self._requests_lock:
+            self.requests_since_reseed += count
+
+def secure_random_indices(entropy: bytes, choices: int, count: int, bit_offset: int = 0) -> Tuple[np.ndarray, int]:
+    """
+    Map an entropy buffer to up to count indices from 0 to choices-1 in bulk.
+    The bits after bit_offset are split into fields of exactly
+    (choices - 1).bit_length() bits and rejection sampled with an array mask,
+    so there is no modulo bias. Returns (indices, bits_consumed).
+    """
+    if choices <= 1:
+        return np.zeros(count, dtype=np.int64), 0
+    
+    field_bits = (choices - 1).bit_length()
+    if field_bits <= 8:
+        dtype = np.uint8
+    elif field_bits <= 16:
+        dtype = np.uint16
+    elif field_bits <= 32:
+        dtype = np.uint32
+    else:
+        dtype = np.uint64
+    
+    bits = np.unpackbits(np.frombuffer(entropy, dtype=np.uint8))[bit_offset:]
+    fields = len(bits) // field_bits
+    columns = bits[:fields * field_bits].reshape(fields, field_bits)
+    
+    # Fold the bit columns of each field into an integer, most significant first
+    values = columns[:, 0].astype(dtype)
+    for column in range(1, field_bits):
+        values <<= 1
+        values |= columns[:, column]
+    
+    accepted = np.flatnonzero(values < choices)[:count]
+    if count and len(accepted) == count:
+        bits_consumed = (int(accepted[-1]) + 1) * field_bits
+    else:
+        bits_consumed = fields * field_bits
+    return values[accepted].astype(np.int64), bits_consumed
+
+def indices_to_text(charset: str, indices: np.ndarray) -> str:
+    """Assemble characters for an index array in one vectorized lookup."""
+    codepoints = np.array([ord(c) for c in charset], dtype='<u4')
+    return codepoints[indices].tobytes().decode('utf-32-le')
+
+class EntropyReader:
+    """
+    Bit-level reader over entropy drawn on demand. Every sample consumes only
+    the bits it needs and leftover bits are kept for the next sample, so the
+    source is topped up only once the reader is truly exhausted. Tracks the
+    snapshots, bytes and bits used.
+    """
+
+    def __init__(self, draw: Callable[[int], Tuple[bytes, int]], chunk_bytes: int):
+        # draw(num_bytes) returns (entropy, snapshots_consumed)
+        self.draw = draw
+        self.chunk_bytes = chunk_bytes
+        self._buffer = bytearray()
+        self._bit_offset = 0
+        # Uniform value in [0, _range) recycled between randbelow() calls
+        self._value = 0
+        self._range = 1
+        self.snapshots_used = 0
+        self.bytes_drawn = 0
+        self.bits_used = 0
+
+    @property
+    def bits_available(self) -> int:
+        return len(self._buffer) * 8 - self._bit_offset
+
+    def _refill(self, bits_needed: int):
+        del self._buffer[:self._bit_offset >> 3]
+        self._bit_offset &= 7
+        # Ask for everything that is missing at once, so the source can fetch it in parallel;
+        # sources may return less, and whatever was drawn is kept if the source runs dry
+        while self.bits_available < bits_needed:
+            missing_bytes = (bits_needed - self.bits_available + 7) // 8
+            chunk, snapshots = self.draw(-(-missing_bytes // self.chunk_bytes) * self.chunk_bytes)
+            self._buffer += chunk
+            self.bytes_drawn += len(chunk)
+            self.snapshots_used += snapshots
+
+    def read_bits(self, num_bits: int) -> int:
+        """Read exactly num_bits bits as an unsigned integer."""
+        if num_bits <= 0:
+            return 0
+        if self.bits_available < num_bits:
+            self._refill(num_bits)
+        
+        start = self._bit_offset >> 3
+        end = (self._bit_offset + num_bits + 7) >> 3
+        chunk = int.from_bytes(self._buffer[start:end], 'big')
+        shift = end * 8 - self._bit_offset - num_bits
+        self._bit_offset += num_bits
+        self.bits_used += num_bits
+        return (chunk >> shift) & ((1 << num_bits) - 1)
+
+    def randbelow(self, choices: int) -> int:
+        """
+        Select a random index from 0 to choices-1 by arithmetic range sampling:
+        fresh bits extend a uniform value until its range covers choices, and
+        whatever is left after accepting or rejecting is recycled.
+        """
+        if choices <= 1:
+            return 0
+        
+        while True:
+            if self._range < choices:
+                num_bits = ((choices - 1) // self._range).bit_length()
+                self._value = (self._value << num_bits) | self.read_bits(num_bits)
+                self._range <<= num_bits
+            
+            limit = self._range - self._range % choices
+            if self._value < limit:
+                result = self._value % choices
+                self._value //= choices
+                self._range = limit // choices
+                return result
+            
+            # Rejected, the excess is still uniform over what remains
+            SAMPLING_REJECTIONS.labels("randbelow").inc()
+            self._value -= limit
+            self._range -= limit
+
+    def choices(self, choices: int, count: int) -> np.ndarray:
+        """Select count random indices from 0 to choices-1 in bulk."""
+        if choices <= 1:
+            return np.zeros(count, dtype=np.int64)
+        
+        field_bits = (choices - 1).bit_length()
+        accept_rate = choices / 2 ** field_bits
+        parts = []
+        remaining = count
+        while remaining:
+            # Expected bits for the remaining indices, given the rejection rate
+            wanted = field_bits * (int(remaining / accept_rate) + 1)
+            if self.bits_available < wanted:
+                self._refill(wanted)
+            
+            start = self._bit_offset >> 3
+            indices, bits_consumed = secure_random_indices(
+                bytes(self._buffer[start:]), choices, remaining, self._bit_offset & 7
+            )
+            self._bit_offset += bits_consumed
+            self.bits_used += bits_consumed
+            rejected = bits_consumed // field_bits - len(indices)
+            if rejected:
+                SAMPLING_REJECTIONS.labels("bulk").inc(rejected)
+            parts.append(indices)
+            remaining -= len(indices)
+        return np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+class EntropyPrefetcher:
+    """
+    Producer threads that claim, read, hash and delete snapshots ahead of
+    demand into a bounded queue of digests, so request handlers only pop
+    from memory instead of doing disk I/O and hashing under the request lock.
+    """
+
+    def __init__(self, index: SnapshotIndex, read_digest: Callable[[], bytes],
+                 depth: int, workers: int, wait: float):
+        self.index = index
+        self.read_digest = read_digest
+        self.depth = depth
+        self.workers = workers
+        self.wait = wait
+        self._queue: "queue.Queue[bytes]" = queue.Queue(maxsize=depth)
+        # Digests producers have read but not yet queued, e.g. while blocked on a full queue
+        self._held = 0
+        self._held_lock = threading.Lock()
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"entropy-prefetch-{i}", daemon=True)
+            thread.start()
+
+    def _run(self):
+        while True:
+            # Clear before reading, so a snapshot added after a failed read still wakes us
+            self.index.added.clear()
+            try:
+                digest = self.read_digest()
+            except EntropyExhaustedError:
+                # Sleep until the index sees a new snapshot
+                self.index.added.wait(timeout=5)
+                continue
+            except Exception as e:
+                logger.error(f"Error prefetching snapshot: {e}")
+                time.sleep(5)
+                continue
+            with self._held_lock:
+                self._held += 1
+            try:
+                # Blocks while the queue is full
+                self._queue.put(digest)
+            finally:
+                with self._held_lock:
+                    self._held -= 1
+
+    def get(self) -> bytes:
+        """Pop a prefetched digest, waiting briefly if producers are catching up."""
+        try:
+            return self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        if len(self.index) == 0:
+            raise EntropyExhaustedError("No available snapshot files - entropy pool exhausted")
+        try:
+            return self._queue.get(timeout=self.wait)
+        except queue.Empty:
+            raise EntropyExhaustedError("No available snapshot files - entropy pool exhausted")
+
+    def __len__(self) -> int:
+        """Digests ready to pop."""
+        return self._queue.qsize()
+
+    @property
+    def buffered(self) -> int:
+        """Snapshots this worker has consumed ahead of demand: queued digests plus those held by producers."""
+        with self._held_lock:
+            return self._queue.qsize() + self._held
+
+HKDF_SALT = b"random-coalesce-v1"
+
+def hkdf_extract(salt: bytes, ikm: bytes) -> bytes:
+    """HKDF-Extract with SHA-256 (RFC 5869)."""
+    return hmac.new(salt, ikm, hashlib.sha256).digest()
+
+class HkdfStream:
+    """
+    Output of HKDF-Expand with SHA-256 (RFC 5869) under one context, read as
+    a stream. Expand is limited to 255 blocks, so after that the stream moves
+    on to the next segment, with the segment number appended to the info.
+    """
+
+    MAX_BLOCKS = 255
+
+    def __init__(self, prk: bytes, context: bytes, snapshots: int = 0):
+        self.prk = prk
+        self.context = context
+        # Reported with the first draw, so the seed's snapshots are counted once per group
+        self.snapshots = snapshots
+        self._segment = 0
+        self._counter = 0
+        self._block = b""
+
+    def _next_block(self) -> bytes:
+        if self._counter == self.MAX_BLOCKS:
+            self._segment += 1
+            self._counter = 0
+            self._block = b""
+        self._counter += 1
+        info = self.context + self._segment.to_bytes(4, "big")
+        self._block = hmac.new(self.prk, self._block + info + bytes([self._counter]), hashlib.sha256).digest()
+        return self._block
+
+    def read(self, num_bytes: int) -> bytes:
+        output = bytearray()
+        while len(output) < num_bytes:
+            output += self._next_block()
+        return bytes(output[:num_bytes])
+
+    def draw(self, num_bytes: int) -> Tuple[bytes, int]:
+        """EntropyReader draw callable."""
+        snapshots, self.snapshots = self.snapshots, 0
+        return self.read(num_bytes), snapshots
+
+class _CoalescedGroup:
+    def __init__(self):
+        self.size = 0
+        self.prk: Optional[bytes] = None
+        self.snapshots = 0
+        self.error: Optional[Exception] = None
+        self.ready = threading.Event()
+
+class RequestCoalescer:
+    """
+    Serves single requests that arrive together from one seed. The first
+    request opens a group and waits up to window seconds (or until the group
+    holds max_batch requests), then draws one seed for the whole group. Every
+    member gets its own HKDF-SHA256 stream keyed by the seed with its position
+    in the group as context, so outputs are independent of each other while
+    the group spends a single draw.
+    """
+
+    def __init__(self, draw: Callable[[int], Tuple[bytes, int]], window: float, max_batch: int):
+        self.draw = draw
+        self.window = window
+        self.max_batch = max_batch
+        self._cond = threading.Condition()
+        self._open: Optional[_CoalescedGroup] = None
+
+    def join(self) -> HkdfStream:
+        """Join the open group, or open one, and return this request's stream once the seed is drawn."""
+        with self._cond:
+            group = self._open
+            leader = group is None
+            if leader:
+                group = self._open = _CoalescedGroup()
+            index = group.size
+            group.size += 1
+            if group.size >= self.max_batch:
+                self._open = None
+                self._cond.notify_all()
+            if leader:
+                deadline = time.monotonic() + self.window
+                while self._open is group:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._open = None
+                        break
+                    self._cond.wait(remaining)
+        
+        if leader:
+            try:
+                seed, snapshots = self.draw(DIGEST_SIZE)
+                if len(seed) < DIGEST_SIZE:
+                    raise EntropyExhaustedError("No available snapshot files - entropy pool exhausted")
+                group.prk = hkdf_extract(HKDF_SALT, seed)
+                group.snapshots = snapshots
+            except Exception as e:
+                group.error = e
+            finally:
+                group.ready.set()
+            COALESCED_BATCH.observe(group.size)
+        else:
+            group.ready.wait()
+        
+        if group.error is not None:
+            raise group.error
+        return HkdfStream(group.prk, index.to_bytes(4, "big"), group.snapshots if leader else 0)
+
+class TokenQueues:
+    """
+    Bounded queues of ready one-time values for fixed-shape requests, kept
+    topped up by a background thread so those requests are a queue pop.
+    Each value is handed out once and dropped. The emptiest queue is always
+    refilled first, and a queue below the low-water mark is refilled
+    before serving anything else.
+    """
+
+    def __init__(self, open_reader: Callable[[], "EntropyReader"], record_usage,
+                 depth: int, low_water: int, batch: int):
+        self.open_reader = open_reader
+        self.record_usage = record_usage
+        self.depth = depth
+        self.low_water = low_water
+        self.batch = batch
+        self._cond = threading.Condition()
+        self._queues: Dict[str, deque] = {}
+        self._builders: Dict[str, Callable[["EntropyReader", int], List[str]]] = {}
+
+    def add(self, profile: str, build: Callable[["EntropyReader", int], List[str]]):
+        """Register a profile; build(reader, count) returns count fresh values."""
+        self._queues[profile] = deque()
+        self._builders[profile] = build
+
+    def start(self):
+        thread = threading.Thread(target=self._run, name="token-queues", daemon=True)
+        thread.start()
+
+    def pop(self, profile: str) -> Optional[str]:
+        """Take a ready value, or None if the queue is empty."""
+        with self._cond:
+            values = self._queues[profile]
+            value = values.popleft() if values else None
+            if len(values) < self.depth:
+                self._cond.notify()
+        TOKEN_QUEUE_LEVEL.labels(profile).set(len(values))
+        if value is None:
+            TOKEN_QUEUE_MISSES.labels(profile).inc()
+        return value
+
+    def _neediest(self) -> Optional[str]:
+        profile = min(self._queues, key=lambda name: len(self._queues[name]), default=None)
+        if profile is None or len(self._queues[profile]) >= self.depth:
+            return None
+        return profile
+
+    def _run(self):
+        reader = self.open_reader()
+        while True:
+            with self._cond:
+                profile = self._cond.wait_for(self._neediest)
+                missing = self.depth - len(self._queues[profile])
+            # A low queue is filled in one go, otherwise top up a batch at a time
+            count = missing if missing >= self.depth - self.low_water else min(missing, self.batch)
+            try:
+                # Each queued value is handed to one request
+                with self.record_usage(reader, "token_queue", count):
+                    values = self._builders[profile](reader, count)
+            except EntropyExhaustedError:
+                time.sleep(1)
+                continue
+            except Exception as e:
+                logger.error(f"Error filling {profile} token queue: {e}")
+                time.sleep(5)
+                continue
+            with self._cond:
+                self._queues[profile].extend(values)
+                level = len(self._queues[profile])
+            TOKEN_QUEUE_LEVEL.labels(profile).set(level)
+
+    def levels(self) -> Dict[str, int]:
+        return {profile: len(values) for profile, values in self._queues.items()}
 
 class RandomStringGenerator:
     def __init__(self):
-        self.used_files: Set[str] = set()
         self._lock = threading.Lock()
-        self.wordlist_path = Path(__file__).parent / "wordlist.txt"
+        self.wordlists = load_wordlists(WORDLISTS)
+        self.consumed_snapshots = 0
+        self.digests_used = 0
+        self._counter_lock = threading.Lock()
+        self._read_buffers = threading.local()
+        self._read_pool: Optional[ThreadPoolExecutor] = None
+        if SNAPSHOT_READ_WORKERS > 1:
+            self._read_pool = ThreadPoolExecutor(SNAPSHOT_READ_WORKERS, thread_name_prefix="snapshot-read")
+        
+        if ENTROPY_SOURCE not in ("snapshots", "seeds"):
+            raise ValueError(f"Unknown ENTROPY_SOURCE: {ENTROPY_SOURCE}")
+        # Bumped whenever the pool level may have changed, for the health stream
+        self.changes = ChangeNotifier()
+        self.snapshots = SnapshotIndex(RANDOMNESS_SOURCE, SNAPSHOT_RESCAN_INTERVAL, self.changes)
+        self._seed_ring: Optional[SeedRing] = None
+        if ENTROPY_SOURCE == "snapshots":
+            self.snapshots.start()
+        
+        self.prefetcher: Optional[EntropyPrefetcher] = None
+        # Seeds are already hashed by the capture service and come straight from memory
+        if PREFETCH_DEPTH > 0 and ENTROPY_SOURCE == "snapshots":
+            self.prefetcher = EntropyPrefetcher(
+                self.snapshots, self.read_snapshot_digest,
+                PREFETCH_DEPTH, PREFETCH_WORKERS, PREFETCH_WAIT
+            )
+            self.prefetcher.start()
+        
+        if ENTROPY_MODE not in ("direct", "reservoir"):
+            raise ValueError(f"Unknown ENTROPY_MODE: {ENTROPY_MODE}")
+        self.reservoir: Optional[EntropyReservoir] = None
+        if ENTROPY_MODE == "reservoir":
+            self.reservoir = EntropyReservoir(
+                self.next_digests, SNAPSHOT_ENTROPY_BITS,
+                DRBG_RESEED_BYTES, DRBG_RESEED_REQUESTS
+            )
+        
+        # Shared reader for single requests, only used while holding _lock
+        self.reader = EntropyReader(self._draw_counted, 32 if self.reservoir is None else 256)
+        
+        self.coalescer: Optional[RequestCoalescer] = None
+        if COALESCE_WINDOW > 0:
+            self.coalescer = RequestCoalescer(self._draw_counted_locked, COALESCE_WINDOW, COALESCE_MAX_BATCH)
+        
+        self.tokens: Optional[TokenQueues] = None
+        if TOKEN_QUEUE_DEPTH > 0:
+            self.tokens = TokenQueues(
+                self.open_reader, self._record_usage,
+                TOKEN_QUEUE_DEPTH, TOKEN_QUEUE_LOW_WATER, TOKEN_QUEUE_BATCH
+            )
+            charset = self._build_charset(FIXED_STRING_CHAR_TYPES)
+            self.tokens.add("string", lambda reader, count: self.build_strings(
+                reader, count, FIXED_STRING_LENGTH, charset
+            ))
+            self.tokens.add("passphrase", lambda reader, count: [
+                self.build_passphrase(reader, self.get_wordlist("default"), FIXED_PASSPHRASE_WORDS, True, True, True)
+                for _ in range(count)
+            ])
+            self.tokens.start()
+    
+    def get_seed_ring(self) -> Optional[SeedRing]:
+        """Get the capture service's seed ring, once it has been created."""
+        if self._seed_ring is None:
+            self._seed_ring = SeedRing.open(SEED_RING_PATH)
+        return self._seed_ring
+    
+    def get_added_count(self) -> int:
+        """Snapshots or seeds that have arrived so far, for measuring the inflow rate."""
+        if ENTROPY_SOURCE == "seeds":
+            seed_ring = self.get_seed_ring()
+            return seed_ring.written if seed_ring is not None else 0
+        return self.snapshots.added_total
+    
+    def snapshot_cost(self, bits: float) -> float:
+        """Estimate how many snapshots drawing this many bits of entropy uses up."""
+        if self.reservoir is None:
+            return bits / (DIGEST_SIZE * 8)
+        # The reservoir only spends snapshots when it reseeds
+        reseed_snapshots = math.ceil(HmacDrbg.SECURITY_STRENGTH / SNAPSHOT_ENTROPY_BITS)
+        return max(bits / 8 / DRBG_RESEED_BYTES, 1 / DRBG_RESEED_REQUESTS) * reseed_snapshots
+    
+    def string_cost(self, length: int, count: int, charset_size: int) -> float:
+        """Expected snapshot cost of count strings, counting rejected samples."""
+        field_bits = (charset_size - 1).bit_length()
+        return self.snapshot_cost(count * length * field_bits * 2 ** field_bits / charset_size)
+    
+    def passphrase_cost(self, word_count: int, word_total: int, add_digit: bool, count: int = 1) -> float:
+        """Expected snapshot cost of count passphrases."""
+        bits = word_count * math.log2(word_total)
+        if add_digit:
+            bits += math.log2(word_count) + math.log2(10)
+        return self.snapshot_cost(count * bits)
+    
+    def request_cost(self, cost: float) -> float:
+        """Snapshot cost of a single request; coalesced requests never cost more than one shared seed."""
+        if self.coalescer is None:
+            return cost
+        return min(cost, self.snapshot_cost(DIGEST_SIZE * 8))
+    
+    def tokens_ready(self, profile: str) -> bool:
+        """Whether a pre-generated value is waiting for this profile."""
+        return self.tokens is not None and self.tokens.levels().get(profile, 0) > 0
     
     def get_available_entropy_count(self) -> int:
         """Get count of available entropy sources."""
-        if not RANDOMNESS_SOURCE.exists():
-            return 0
-        
-        available_files = [
-            f for f in RANDOMNESS_SOURCE.glob("*") 
-            if f.is_file() and f.name not in self.used_files
-        ]
-        return len(available_files)
+        if ENTROPY_SOURCE == "seeds":
+            seed_ring = self.get_seed_ring()
+            return len(seed_ring) if seed_ring is not None else 0
+        prefetched = self.prefetcher.buffered if self.prefetcher is not None else 0
+        return len(self.snapshots) + prefetched
 
-    def get_random_snapshot_deterministic(self) -> Path:
-        """Get snapshot file using deterministic selection (oldest first)."""
+    def get_total_snapshot_count(self) -> int:
+        """Available snapshots plus those this worker has claimed and not yet deleted."""
+        available = self.get_available_entropy_count()
+        if ENTROPY_SOURCE == "seeds":
+            return available
+        return available + self.snapshots.claimed
+    
+    def claim_snapshots(self, count: int) -> List[Path]:
+        """Claim up to count of the oldest snapshots at once."""
         if not RANDOMNESS_SOURCE.exists():
             raise Exception(f"Randomness source directory {RANDOMNESS_SOURCE} does not exist")
         
-        available_files = [
-            f for f in RANDOMNESS_SOURCE.glob("*") 
-            if f.is_file() and f.name not in self.used_files
-        ]
-        
-        if not available_files:
-            raise Exception("No available snapshot files - entropy pool exhausted")
+        claimed = []
+        while len(claimed) < count:
+            path = self.snapshots.claim_oldest()
+            if path is None:
+                break
+            claimed.append(path)
         
         # Warn if entropy is running low
-        if len(available_files) <= 5:
-            logger.warning(f"Low entropy warning: only {len(available_files)} snapshots remaining")
+        remaining = len(self.snapshots)
+        if claimed and remaining < 5:
+            logger.warning(f"Low entropy warning: only {remaining} snapshots remaining")
+        return claimed
+    
+    def hash_snapshot(self, snapshot_file: Path) -> Optional[bytes]:
+        """
+        Hash a claimed snapshot in fixed-size chunks read into a reusable
+        per-thread buffer, then delete it. Returns None if the file is gone.
+        """
+        buffer = getattr(self._read_buffers, "buffer", None)
+        if buffer is None:
+            buffer = self._read_buffers.buffer = memoryview(bytearray(SNAPSHOT_READ_CHUNK))
+        
+        digest = hashlib.sha256()
+        read_time = hash_time = 0.0
+        try:
+            with open(snapshot_file, 'rb', buffering=0) as f:
+                while True:
+                    started = time.perf_counter()
+                    size = f.readinto(buffer)
+                    read_done = time.perf_counter()
+                    read_time += read_done - started
+                    if not size:
+                        break
+                    # hashlib releases the GIL on large updates, so reader threads hash in parallel
+                    digest.update(buffer[:size])
+                    hash_time += time.perf_counter() - read_done
+        except FileNotFoundError:
+            # Claim directory was cleaned up underneath us
+            self.snapshots.release(snapshot_file)
+            return None
+        SNAPSHOT_OPERATION.labels("read").observe(read_time)
+        SNAPSHOT_OPERATION.labels("hash").observe(hash_time)
+        
+        # Delete used snapshot
+        started = time.perf_counter()
+        self.snapshots.release(snapshot_file)
+        SNAPSHOT_OPERATION.labels("unlink").observe(time.perf_counter() - started)
+        with self._counter_lock:
+            self.consumed_snapshots += 1
+        logger.debug(f"Used and deleted snapshot: {snapshot_file.name}")
+        return digest.digest()
+    
+    def read_snapshot_digests(self, count: int) -> List[bytes]:
+        """
+        Consume up to count of the oldest snapshots, claimed up front and then
+        read and hashed in parallel. Returns fewer digests only if the pool runs out.
+        """
+        digests: List[bytes] = []
+        while len(digests) < count:
+            claimed = self.claim_snapshots(count - len(digests))
+            if not claimed:
+                break
+            if len(claimed) == 1 or self._read_pool is None:
+                results = [self.hash_snapshot(path) for path in claimed]
+            else:
+                results = list(self._read_pool.map(self.hash_snapshot, claimed))
+            digests.extend(digest for digest in results if digest is not None)
         
-        # Sort by modification time for deterministic selection (oldest first)
-        available_files.sort(key=lambda x: x.stat().st_mtime)
-        selected_file = available_files[0]
-        self.used_files.add(selected_file.name)
-        return selected_file
+        if not digests:
+            raise EntropyExhaustedError("No available snapshot files - entropy pool exhausted")
+        return digests
+    
+    def read_snapshot_digest(self) -> bytes:
+        """Consume the oldest snapshot: read it, hash it and delete it."""
+        return self.read_snapshot_digests(1)[0]
+    
+    def read_seeds(self, count: int) -> List[bytes]:
+        """Consume up to count seeds published by the capture service in the seed ring."""
+        seed_ring = self.get_seed_ring()
+        seeds = seed_ring.pop(count) if seed_ring is not None else []
+        if not seeds:
+            raise EntropyExhaustedError("No available seeds - entropy pool exhausted")
+        with self._counter_lock:
+            self.consumed_snapshots += len(seeds)
+        return seeds
+    
+    def next_digests(self, count: int) -> List[bytes]:
+        """
+        Take up to count snapshot digests, from the seed ring, the prefetch queue
+        or straight from the snapshots. Returns fewer only if the pool runs out.
+        """
+        if ENTROPY_SOURCE == "seeds":
+            digests = self.read_seeds(count)
+        elif self.prefetcher is not None:
+            try:
+                digests = [self.prefetcher.get()]
+            except EntropyExhaustedError:
+                # The producers are stalled but snapshots may still be indexed; read them directly
+                digests = []
+            # Top up from the queue, or from disk once it is empty
+            while len(digests) < count and len(self.prefetcher):
+                digests.append(self.prefetcher.get())
+            if not digests:
+                digests = self.read_snapshot_digests(count)
+            elif len(digests) < count:
+                try:
+                    digests.extend(self.read_snapshot_digests(count - len(digests)))
+                except EntropyExhaustedError:
+                    pass
+        else:
+            digests = self.read_snapshot_digests(count)
+        self.digests_used += len(digests)
+        self.changes.notify()
+        return digests
     
     def _build_charset(self, char_types: List[str]) -> str:
         """Build character set from requested types."""
@@ -77,200 +1292,467 @@ class RandomStringGenerator:
         return charset
     
     def generate_entropy_pool(self, required_bytes: int) -> bytes:
-        """Generate sufficient entropy pool for the requested output length."""
-        entropy_pool = b''
-        
-        while len(entropy_pool) < required_bytes:
-            snapshot_file = self.get_random_snapshot_deterministic()
-            
-            with open(snapshot_file, 'rb') as f:
-                snapshot_data = f.read()
-            
-            # Hash and append to pool
-            entropy_chunk = hashlib.sha256(snapshot_data).digest()
-            entropy_pool += entropy_chunk
-            
-            # Delete used snapshot
-            snapshot_file.unlink()
-            logger.info(f"Used and deleted snapshot: {snapshot_file.name}")
-        
-        return entropy_pool[:required_bytes]
+        """Generate an entropy pool of whole snapshot digests covering required_bytes."""
+        count = -(-required_bytes // DIGEST_SIZE)
+        entropy_pool = bytearray(count * DIGEST_SIZE)
+        filled = 0
+        while filled < len(entropy_pool):
+            for digest in self.next_digests((len(entropy_pool) - filled) // DIGEST_SIZE):
+                entropy_pool[filled:filled + DIGEST_SIZE] = digest
+                filled += DIGEST_SIZE
+        return bytes(entropy_pool)
     
-    def _secure_random_choice(self, entropy_pool: bytes, offset: int, choices: int) -> tuple[int, int]:
+    def _draw_entropy(self, entropy_needed: int) -> bytes:
         """
-        Select a random index from 0 to choices-1 using rejection sampling to avoid modulo bias.
-        Returns (selected_index, bytes_consumed).
+        Draw entropy from the reservoir, or up to entropy_needed bytes of whole
+        snapshot digests; less only when the pool runs out, so callers keep what was drawn.
         """
-        if choices <= 1:
-            return 0, 0
-        
-        # Calculate how many bits we need
-        bits_needed = (choices - 1).bit_length()
-        bytes_needed = (bits_needed + 7) // 8
-        
-        max_attempts = 100  # Prevent infinite loops
-        for attempt in range(max_attempts):
-            if offset + bytes_needed > len(entropy_pool):
-                # Not enough entropy remaining, use what we have with modulo (fallback)
-                remaining_bytes = len(entropy_pool) - offset
-                if remaining_bytes > 0:
-                    value = int.from_bytes(entropy_pool[offset:offset + remaining_bytes], 'big')
-                    return value % choices, remaining_bytes
-                else:
-                    return 0, 0
-            
-            # Extract the needed bytes
-            value = int.from_bytes(entropy_pool[offset:offset + bytes_needed], 'big')
-            
-            # Check if value is in valid range (rejection sampling)
-            max_valid = (2 ** (bytes_needed * 8)) // choices * choices
-            if value < max_valid:
-                return value % choices, bytes_needed
-            
-            # Rejected, try next bytes
-            offset += 1
-            if offset >= len(entropy_pool):
-                break
-        
-        # Fallback if we couldn't find a valid value
-        final_byte = entropy_pool[min(offset, len(entropy_pool) - 1)]
-        return final_byte % choices, 1
-
+        if self.reservoir is not None:
+            return self.reservoir.read(entropy_needed)
+        return b''.join(self.next_digests(-(-entropy_needed // DIGEST_SIZE)))
+    
+    def _draw_counted(self, entropy_needed: int) -> Tuple[bytes, int]:
+        """Draw entropy and report how many snapshots it consumed; caller holds the lock."""
+        digests_before = self.digests_used
+        entropy = self._draw_entropy(entropy_needed)
+        return entropy, self.digests_used - digests_before
+    
+    def _draw_counted_locked(self, entropy_needed: int) -> Tuple[bytes, int]:
+        with self._locked():
+            return self._draw_counted(entropy_needed)
+    
+    @contextmanager
+    def _locked(self):
+        """Hold the generator lock, recording how long it took to get it."""
+        started = time.perf_counter()
+        with self._lock:
+            LOCK_WAIT.observe(time.perf_counter() - started)
+            yield
+    
+    @contextmanager
+    def _request_reader(self):
+        """The reader for one single request: the shared reader under the lock, or a coalesced stream."""
+        if self.coalescer is None:
+            with self._locked():
+                yield self.reader
+        else:
+            yield EntropyReader(self.coalescer.join().draw, DIGEST_SIZE)
+    
+    @contextmanager
+    def _record_usage(self, reader: EntropyReader, request_type: Optional[str] = None, requests: int = 1):
+        """
+        Attribute the snapshots and bytes a reader draws in this block to the
+        current request type, and count the requests it served towards the reservoir's reseed budget.
+        """
+        snapshots_before = reader.snapshots_used
+        bytes_before = reader.bytes_drawn
+        try:
+            yield
+        finally:
+            if request_type is None:
+                request_type = current_request_type.get()
+            if request_type is None:
+                request_type = request.endpoint if has_request_context() and request.endpoint else "internal"
+            SNAPSHOTS_CONSUMED.labels(request_type).inc(reader.snapshots_used - snapshots_before)
+            ENTROPY_BYTES.labels(request_type).inc(reader.bytes_drawn - bytes_before)
+            if self.reservoir is not None and requests:
+                self.reservoir.count_requests(requests)
+    
     def generate_random_string(self, length: int, char_types: List[str]) -> str:
         """Generate a random string using snapshot data as entropy."""
-        with self._lock:
+        with self._request_reader() as reader, self._record_usage(reader):
             try:
                 # Build character set
                 charset = self._build_charset(char_types)
-                charset_size = len(charset)
-                
-                # Calculate entropy needed (more generous allocation)
-                bytes_per_char = max(2, (charset_size - 1).bit_length() // 4)  # At least 2 bytes per char
-                entropy_needed = length * bytes_per_char
-                
-                # Use single snapshot for moderate strings, entropy pooling for very long ones
-                if entropy_needed <= 32:  # Single SHA256 output
-                    snapshot_file = self.get_random_snapshot_deterministic()
-                    
-                    with open(snapshot_file, 'rb') as f:
-                        snapshot_data = f.read()
-                    
-                    # Use full SHA256 output as entropy
-                    entropy_pool = hashlib.sha256(snapshot_data).digest()
-                    
-                    # Delete used snapshot
-                    snapshot_file.unlink()
-                    logger.info(f"Used and deleted snapshot: {snapshot_file.name}")
-                else:
-                    # For very long strings, use entropy pooling
-                    entropy_pool = self.generate_entropy_pool(entropy_needed)
-                
-                # Generate string using secure selection
-                result = []
-                entropy_offset = 0
-                
-                for i in range(length):
-                    char_index, bytes_consumed = self._secure_random_choice(
-                        entropy_pool, entropy_offset, charset_size
-                    )
-                    result.append(charset[char_index])
-                    entropy_offset += bytes_consumed
-                    
-                    # Ensure we don't run out of entropy
-                    if entropy_offset >= len(entropy_pool):
-                        break
                 
-                return ''.join(result)
+                # Without coalescing, leftover bits stay in the shared reader for the next request
+                return self.build_string(reader, length, charset)
                 
             except Exception as e:
                 logger.error(f"Error generating random string: {e}")
                 raise
     
+    def generate_random_strings(self, length: int, count: int, char_types: List[str]) -> List[str]:
+        """Generate count random strings for one request from a single reader."""
+        with self._request_reader() as reader, self._record_usage(reader):
+            try:
+                return self.build_strings(reader, count, length, self._build_charset(char_types))
+                
+            except Exception as e:
+                logger.error(f"Error generating random strings: {e}")
+                raise
+    
+    def get_wordlist(self, name: str) -> _WordlistData:
+        """Get a loaded wordlist by name."""
+        if name not in self.wordlists:
+            raise ValueError(f"Unknown wordlist: {name}")
+        return self.wordlists[name].get()
+    
     def generate_passphrase(self, word_count: int, capitalize_words: bool, 
-                          separate_with_dashes: bool, add_digit: bool) -> str:
+                          separate_with_dashes: bool, add_digit: bool,
+                          wordlist: str = "default") -> str:
         """Generate a passphrase using snapshot data as entropy."""
-        with self._lock:
+        with self._request_reader() as reader, self._record_usage(reader):
             try:
-                # Load wordlist
-                if not self.wordlist_path.exists():
-                    raise Exception("Wordlist file not found")
-                
-                with open(self.wordlist_path, 'r') as f:
-                    words = [line.strip() for line in f if line.strip()]
-                
-                if not words:
-                    raise Exception("Empty wordlist")
-                
-                wordlist_size = len(words)
-                
-                # Calculate entropy needed (more generous allocation)
-                bytes_per_word = max(3, (wordlist_size - 1).bit_length() // 4)  # At least 3 bytes per word
-                entropy_needed = word_count * bytes_per_word + (4 if add_digit else 0)
-                
-                # Use single snapshot for moderate passphrases, entropy pooling for very long ones
-                if entropy_needed <= 32:  # Single SHA256 output
-                    snapshot_file = self.get_random_snapshot_deterministic()
-                    
-                    with open(snapshot_file, 'rb') as f:
-                        snapshot_data = f.read()
-                    
-                    # Use full SHA256 output as entropy
-                    entropy_pool = hashlib.sha256(snapshot_data).digest()
-                    
-                    # Delete used snapshot
-                    snapshot_file.unlink()
-                    logger.info(f"Used and deleted snapshot: {snapshot_file.name}")
-                else:
-                    # For very long passphrases, use entropy pooling
-                    entropy_pool = self.generate_entropy_pool(entropy_needed)
-                
-                selected_words = []
-                entropy_offset = 0
-                digit_position = None
-                
-                # Determine digit position if needed using secure selection
-                if add_digit:
-                    digit_position, bytes_consumed = self._secure_random_choice(
-                        entropy_pool, entropy_offset, word_count
-                    )
-                    entropy_offset += bytes_consumed
-                
-                # Select words using secure selection
-                for i in range(word_count):
-                    word_index, bytes_consumed = self._secure_random_choice(
-                        entropy_pool, entropy_offset, wordlist_size
-                    )
-                    word = words[word_index]
-                    entropy_offset += bytes_consumed
-                    
-                    # Add digit to designated word
-                    if add_digit and i == digit_position:
-                        # Use secure selection for digit (0-9)
-                        digit, digit_bytes_consumed = self._secure_random_choice(
-                            entropy_pool, entropy_offset, 10
-                        )
-                        word += str(digit)
-                        entropy_offset += digit_bytes_consumed
-                    
-                    # Capitalize if requested
-                    if capitalize_words:
-                        word = word.capitalize()
-                    
-                    selected_words.append(word)
-                    
-                    # Ensure we don't run out of entropy
-                    if entropy_offset >= len(entropy_pool):
-                        break
-                
-                # Join with appropriate separator
-                separator = '-' if separate_with_dashes else ' '
-                return separator.join(selected_words)
+                words = self.get_wordlist(wordlist)
+                return self.build_passphrase(
+                    reader, words, word_count, capitalize_words, separate_with_dashes, add_digit
+                )
                 
             except Exception as e:
                 logger.error(f"Error generating passphrase: {e}")
                 raise
+    
+    def take_fixed_string(self, slot: Callable[[], ContextManager] = nullcontext) -> str:
+        """A 32-character alphanumeric string, from the token queue when one is ready, else generated inside slot()."""
+        value = self.tokens.pop("string") if self.tokens is not None else None
+        if value is None:
+            with slot():
+                value = self.generate_random_string(FIXED_STRING_LENGTH, FIXED_STRING_CHAR_TYPES)
+        return value
+    
+    def take_fixed_passphrase(self, slot: Callable[[], ContextManager] = nullcontext) -> str:
+        """A 3-word capitalized, dashed passphrase with one digit, taken like take_fixed_string."""
+        value = self.tokens.pop("passphrase") if self.tokens is not None else None
+        if value is None:
+            with slot():
+                value = self.generate_passphrase(FIXED_PASSPHRASE_WORDS, True, True, True)
+        return value
+    
+    def open_reader(self) -> EntropyReader:
+        """Open a private entropy reader for batch generation."""
+        # A refill claims every snapshot it is missing at once; direct mode rounds up to whole
+        # snapshots only, so a batch never draws more than it uses
+        chunk_bytes = 32 if self.reservoir is None else 4096
+        return EntropyReader(self._draw_counted_locked, chunk_bytes)
+    
+    def build_string(self, reader: EntropyReader, length: int, charset: str) -> str:
+        """Build one random string from an entropy reader."""
+        return indices_to_text(charset, reader.choices(len(charset), length))
+    
+    def build_strings(self, reader: EntropyReader, count: int, length: int, charset: str) -> List[str]:
+        """Build count random strings from one bulk draw of indices."""
+        text = indices_to_text(charset, reader.choices(len(charset), count * length))
+        return [text[i:i + length] for i in range(0, count * length, length)]
+    
+    def build_passphrase(self, reader: EntropyReader, words: _WordlistData, word_count: int,
+                         capitalize_words: bool, separate_with_dashes: bool, add_digit: bool) -> str:
+        """Build one passphrase from an entropy reader."""
+        digit_position = reader.randbelow(word_count) if add_digit else None
+        
+        selected_words = []
+        for i in range(word_count):
+            word = words.word(reader.randbelow(len(words)))
+            if i == digit_position:
+                word += str(reader.randbelow(10))
+            if capitalize_words:
+                word = word.capitalize()
+            selected_words.append(word)
+        
+        separator = '-' if separate_with_dashes else ' '
+        return separator.join(selected_words)
+
+class PoolDepletionTracker:
+    """
+    Samples the pool level periodically and keeps a smoothed net depletion
+    rate, from which the time until the pool runs empty is projected.
+    """
+
+    def __init__(self, generator: "RandomStringGenerator", interval: int, smoothing: float = 0.3):
+        self.generator = generator
+        self.interval = interval
+        self.smoothing = smoothing
+        self.rate = 0.0
+        self.inflow_rate = 0.0
+        self._last = None
+
+    def start(self):
+        thread = threading.Thread(target=self._run, name="pool-depletion", daemon=True)
+        thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"Error sampling pool level: {e}")
+            time.sleep(self.interval)
+
+    def sample(self):
+        level = self.generator.get_available_entropy_count()
+        added = self.generator.get_added_count()
+        now = time.monotonic()
+        if self._last is not None:
+            last_level, last_added, last_time = self._last
+            if now > last_time:
+                rate = (last_level - level) / (now - last_time)
+                self.rate += self.smoothing * (rate - self.rate)
+                inflow = (added - last_added) / (now - last_time)
+                self.inflow_rate += self.smoothing * (inflow - self.inflow_rate)
+        self._last = (level, added, now)
+        
+        POOL_LEVEL.set(level)
+        POOL_INFLOW_RATE.set(self.inflow_rate)
+        DEPLETION_RATE.set(self.rate)
+        TIME_TO_EMPTY.set(level / self.rate if self.rate > 0 else float('inf'))
+
+class AdmissionRejected(Exception):
+    """A request turned away before running; carries the HTTP status and Retry-After."""
+
+    def __init__(self, status: int, message: str, retry_after: float, reason: str):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+        self.retry_after = max(1, min(ADMISSION_MAX_RETRY_AFTER, math.ceil(retry_after)))
+
+    def response(self):
+        response = jsonify({'error': str(self), 'retry_after': self.retry_after})
+        response.status_code = self.status
+        response.headers['Retry-After'] = str(self.retry_after)
+        return response
+
+class ClientBuckets:
+    """
+    Per-client token buckets denominated in snapshots. A request is admitted
+    while the bucket holds its cost (or is full, so requests larger than the
+    burst still get through). The bucket may then go into debt, but never
+    more than one burst, so one oversized request cannot lock a client out indefinitely.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def take(self, client: str, cost: float):
+        """Charge cost to the client's bucket or raise AdmissionRejected with 429."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            needed = min(cost, self.burst)
+            if tokens < needed:
+                self._buckets[client] = (tokens, now)
+                retry_after = (needed - tokens) / self.rate if self.rate > 0 else ADMISSION_MAX_RETRY_AFTER
+                raise AdmissionRejected(429, "Entropy rate limit exceeded for this client", retry_after, "client_rate")
+            self._buckets[client] = (max(-self.burst, tokens - cost), now)
+            # Full buckets carry no state, forget them once the table grows
+            if len(self._buckets) > 10000:
+                self._buckets = {
+                    name: (level, at) for name, (level, at) in self._buckets.items()
+                    if level + (now - at) * self.rate < self.burst
+                }
+
+    def refund(self, client: str, cost: float):
+        """Give back the cost of a request that was charged but never ran."""
+        now = time.monotonic()
+        with self._lock:
+            if client not in self._buckets:
+                return
+            tokens, updated = self._buckets[client]
+            self._buckets[client] = (min(self.burst, tokens + (now - updated) * self.rate + cost), now)
+
+class FairScheduler:
+    """
+    Weighted fair queue (start-time fair queuing) in front of the generator.
+    Each job is tagged with a virtual finish time of its start plus cost over
+    the client's weight, and free slots go to the smallest tag, so a client
+    sending large or many requests only delays itself.
+    """
+
+    def __init__(self, slots: int, max_queue: int, timeout: float):
+        self.slots = slots
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._heap: List[list] = []
+        self._waiting = 0
+        self._active = 0
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+        self._sequence = 0
+
+    @contextmanager
+    def slot(self, client: str, cost: float, weight: float = 1.0):
+        """Wait for a turn to run a job of the given snapshot cost."""
+        started = time.monotonic()
+        with self._cond:
+            if self._waiting >= self.max_queue:
+                raise AdmissionRejected(503, "Too many requests waiting for entropy", self.timeout, "queue_full")
+            start_tag = max(self._virtual_time, self._last_finish.get(client, 0.0))
+            self._last_finish[client] = start_tag + cost / weight
+            self._sequence += 1
+            # [finish tag, arrival order, start tag, state]
+            job = [self._last_finish[client], self._sequence, start_tag, "waiting"]
+            heapq.heappush(self._heap, job)
+            self._waiting += 1
+            self._dispatch()
+            deadline = started + self.timeout
+            while job[3] == "waiting":
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    if job[3] == "waiting":
+                        job[3] = "cancelled"
+                        self._waiting -= 1
+                        raise AdmissionRejected(503, "Timed out waiting for entropy", self.timeout, "queue_timeout")
+        ADMISSION_QUEUE_WAIT.observe(time.monotonic() - started)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._dispatch()
+
+    def _dispatch(self):
+        """Grant free slots to the waiting jobs with the smallest finish tags; caller holds the lock."""
+        granted = False
+        while self._active < self.slots and self._heap:
+            job = heapq.heappop(self._heap)
+            if job[3] == "cancelled":
+                continue
+            job[3] = "running"
+            self._waiting -= 1
+            self._active += 1
+            self._virtual_time = max(self._virtual_time, job[2])
+            granted = True
+        if not self._heap and self._active == 0:
+            # Idle: history no longer matters
+            self._last_finish.clear()
+        if granted:
+            self._cond.notify_all()
+
+def parse_client_weights(spec: str) -> Dict[str, float]:
+    """Parse 'client=weight,client=weight'."""
+    weights = {}
+    for item in spec.split(','):
+        name, _, weight = item.strip().partition('=')
+        if name and weight:
+            weights[name.strip()] = float(weight)
+    return weights
+
+class AdmissionController:
+    """
+    Admission in front of the generator: estimates a request's snapshot
+    cost, refuses work the pool cannot cover (503), charges the rest to the
+    client's token bucket (429 when empty) and queues it fairly, refunding
+    the charge if the queue turns it away. Retry-After
+    is derived from the bucket refill rate or the pool's measured inflow.
+    """
+
+    def __init__(self, generator: "RandomStringGenerator", depletion: "PoolDepletionTracker"):
+        self.generator = generator
+        self.depletion = depletion
+        self.enabled = ADMISSION_CONTROL
+        self.buckets = ClientBuckets(ADMISSION_CLIENT_RATE, ADMISSION_CLIENT_BURST)
+        self.scheduler = FairScheduler(ADMISSION_SLOTS, ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT)
+        self.weights = parse_client_weights(ADMISSION_CLIENT_WEIGHTS)
+
+    def client_id(self, headers=None, remote_addr: Optional[str] = None) -> str:
+        """Identify the client from the given headers and address, or from the current Flask request."""
+        if headers is None:
+            headers, remote_addr = request.headers, request.remote_addr
+        if ADMISSION_CLIENT_HEADER:
+            value = headers.get(ADMISSION_CLIENT_HEADER, "")
+            if value:
+                return value.split(',')[0].strip()
+        return remote_addr or "unknown"
+
+    def pool_retry_after(self, snapshots_short: float) -> float:
+        """Seconds until the pool should have refilled by snapshots_short at the measured inflow."""
+        if self.depletion.inflow_rate <= 0:
+            return ADMISSION_MAX_RETRY_AFTER
+        return snapshots_short / self.depletion.inflow_rate
+
+    def exhausted(self) -> AdmissionRejected:
+        """The rejection for a request that ran out of entropy part way."""
+        ADMISSION_REJECTIONS.labels("exhausted").inc()
+        return AdmissionRejected(503, "Entropy pool exhausted, try again later", self.pool_retry_after(1), "exhausted")
+
+    def check(self, cost: float, prepaid: bool = False, client: Optional[str] = None) -> str:
+        """Charge a request's cost, raising AdmissionRejected if it should not run; returns the client id."""
+        if client is None:
+            client = self.client_id()
+        if not self.enabled:
+            return client
+        try:
+            # Check the pool first, so a request the pool cannot cover is not charged
+            # Prepaid requests are served from entropy drawn earlier (the token queues)
+            if not prepaid and self.generator.reservoir is None:
+                available = self.generator.get_available_entropy_count()
+                if cost > available:
+                    raise AdmissionRejected(
+                        503, f"Not enough entropy available: needs about {math.ceil(cost)} snapshots, "
+                             f"{available} available", self.pool_retry_after(cost - available), "pool"
+                    )
+            self.buckets.take(client, cost)
+        except AdmissionRejected as e:
+            ADMISSION_REJECTIONS.labels(e.reason).inc()
+            raise
+        return client
+
+    @contextmanager
+    def slot(self, client: str, cost: float, refund: Optional[float] = None):
+        """
+        Wait for a fair turn at the generator. If the queue rejects the
+        request, refund what check() charged for it (cost unless given).
+        """
+        if not self.enabled:
+            yield
+            return
+        with ExitStack() as stack:
+            try:
+                stack.enter_context(self.scheduler.slot(client, cost, self.weights.get(client, 1.0)))
+            except AdmissionRejected as e:
+                ADMISSION_REJECTIONS.labels(e.reason).inc()
+                self.buckets.refund(client, cost if refund is None else refund)
+                raise
+            yield
+
+    @contextmanager
+    def admit(self, cost: float):
+        """check() then slot() for a request that runs in one go."""
+        client = self.check(cost)
+        with self.slot(client, cost):
+            yield
+
+    def take_fixed(self, take: Callable[[Callable[[], ContextManager]], str], profile: str, cost: float,
+                   client: Optional[str] = None) -> str:
+        """
+        Serve a fixed-shape request with take (take_fixed_string or _passphrase).
+        A ready token is prepaid and popped without waiting in the fair queue;
+        only the synchronous fallback waits for a slot.
+        """
+        client = self.check(cost, self.generator.tokens_ready(profile), client)
+        return take(lambda: self.slot(client, cost))
 
 generator = RandomStringGenerator()
+depletion = PoolDepletionTracker(generator, DEPLETION_SAMPLE_INTERVAL)
+depletion.start()
+admission = AdmissionController(generator, depletion)
+
+def fixed_string_cost() -> float:
+    return generator.request_cost(
+        generator.string_cost(FIXED_STRING_LENGTH, 1, len(generator._build_charset(FIXED_STRING_CHAR_TYPES)))
+    )
+
+def fixed_passphrase_cost() -> float:
+    return generator.request_cost(
+        generator.passphrase_cost(FIXED_PASSPHRASE_WORDS, len(generator.get_wordlist("default")), True)
+    )
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        REQUEST_LATENCY.labels(
+            request.endpoint or "unknown", request.method, str(response.status_code)
+        ).observe(time.perf_counter() - started)
+    return response
 
 @app.route('/')
 def index():
@@ -280,15 +1762,15 @@ def index():
 def string_page():
     """Generate and display a single 32-character random string"""
     try:
-        # Fixed parameters for string page
-        length = 32
-        char_types = ['uppercase', 'lowercase', 'numbers']
-        
-        # Generate string
-        random_string = generator.generate_random_string(length, char_types)
+        random_string = admission.take_fixed(generator.take_fixed_string, "string", fixed_string_cost())
         
         return render_template('string.html', generated_string=random_string)
         
+    except AdmissionRejected as e:
+        return render_template('string.html', error=str(e)), e.status, {'Retry-After': str(e.retry_after)}
+    except EntropyExhaustedError as e:
+        e = admission.exhausted()
+        return render_template('string.html', error=str(e)), e.status, {'Retry-After': str(e.retry_after)}
     except Exception as e:
         logger.error(f"Error in string page: {e}")
         return render_template('string.html', error=str(e))
@@ -297,55 +1779,158 @@ def string_page():
 def passphrase_page():
     """Generate and display a 3-word passphrase"""
     try:
-        # Fixed parameters for passphrase page
-        word_count = 3
-        capitalize_words = True
-        separate_with_dashes = True
-        add_digit = True
-        
-        # Generate passphrase
-        passphrase = generator.generate_passphrase(
-            word_count, capitalize_words, separate_with_dashes, add_digit
-        )
+        passphrase = admission.take_fixed(generator.take_fixed_passphrase, "passphrase", fixed_passphrase_cost())
         
         return render_template('passphrase.html', generated_passphrase=passphrase)
         
+    except AdmissionRejected as e:
+        return render_template('passphrase.html', error=str(e)), e.status, {'Retry-After': str(e.retry_after)}
+    except EntropyExhaustedError as e:
+        e = admission.exhausted()
+        return render_template('passphrase.html', error=str(e)), e.status, {'Retry-After': str(e.retry_after)}
     except Exception as e:
         logger.error(f"Error in passphrase page: {e}")
         return render_template('passphrase.html', error=str(e))
 
-@app.route('/generate', methods=['POST'])
-def generate():
-    try:
-        data = request.json
-        length = int(data.get('length', 16))
-        count = int(data.get('count', 1))
-        char_types = data.get('charTypes', [])
+class RequestError(Exception):
+    """Invalid request parameters; reported to the client with a 400."""
+
+def parse_string_options(data: Dict) -> Tuple[int, int, List[str]]:
+    """Validate a /generate body; returns length, count and character types."""
+    length = int(data.get('length', 16))
+    count = int(data.get('count', 1))
+    char_types = data.get('charTypes', [])
+    
+    if length < 1 or length > MAX_STRING_LENGTH:
+        raise RequestError(f'Length must be between 1 and {MAX_STRING_LENGTH}')
+    
+    # Enforce maximum limit
+    if count < 1 or count > MAX_STRINGS_PER_REQUEST:
+        raise RequestError(f'Count must be between 1 and {MAX_STRINGS_PER_REQUEST}')
+    
+    if not char_types:
+        raise RequestError('At least one character type must be selected')
+    return length, count, char_types
+
+def parse_passphrase_options(data: Dict) -> Tuple[int, bool, bool, bool, str]:
+    """Validate passphrase options; returns word count, capitalize, dashes, digit and wordlist."""
+    word_count = int(data.get('wordCount', 4))
+    capitalize_words = bool(data.get('capitalizeWords', True))
+    separate_with_dashes = bool(data.get('separateWithDashes', False))
+    add_digit = bool(data.get('addDigit', False))
+    wordlist = str(data.get('wordlist', 'default'))
+    
+    if word_count < 3 or word_count > 12:
+        raise RequestError('Word count must be between 3 and 12')
+    
+    if wordlist not in generator.wordlists:
+        raise RequestError(f'Unknown wordlist: {wordlist}')
+    return word_count, capitalize_words, separate_with_dashes, add_digit, wordlist
+
+def string_request_cost(length: int, count: int, char_types: List[str]) -> float:
+    return generator.request_cost(generator.string_cost(length, count, len(generator._build_charset(char_types))))
+
+def passphrase_request_cost(word_count: int, add_digit: bool, wordlist: str) -> float:
+    return generator.request_cost(
+        generator.passphrase_cost(word_count, len(generator.get_wordlist(wordlist)), add_digit)
+    )
+
+class BulkPlan:
+    """A validated /generate-bulk request: what to build, how much of it and what each item costs."""
+
+    def __init__(self, data: Dict):
+        self.kind = data.get('type', 'string')
+        self.count = int(data.get('count', 1))
+        self.output_format = data.get('format', 'ndjson')
         
-        # Validate inputs
-        if length < 1 or length > MAX_STRING_LENGTH:
-            return jsonify({'error': f'Length must be between 1 and {MAX_STRING_LENGTH}'}), 400
+        if self.kind not in ('string', 'passphrase'):
+            raise RequestError("Type must be 'string' or 'passphrase'")
         
-        # Enforce maximum limit
-        if count < 1 or count > MAX_STRINGS_PER_REQUEST:
-            return jsonify({'error': f'Count must be between 1 and {MAX_STRINGS_PER_REQUEST}'}), 400
+        if self.output_format not in ('ndjson', 'text'):
+            raise RequestError("Format must be 'ndjson' or 'text'")
         
-        # Check if we have enough snapshots
-        available_snapshots = len(list(RANDOMNESS_SOURCE.glob("*")))
-        if count > available_snapshots:
-            return jsonify({'error': f'Not enough entropy available. Requested {count}, but only {available_snapshots} snapshots available'}), 400
+        if self.count < 1 or self.count > MAX_BULK_COUNT:
+            raise RequestError(f'Count must be between 1 and {MAX_BULK_COUNT}')
         
-        if not char_types:
-            return jsonify({'error': 'At least one character type must be selected'}), 400
+        if self.kind == 'string':
+            length = int(data.get('length', 16))
+            char_types = data.get('charTypes', [])
+            if length < 1 or length > MAX_STRING_LENGTH:
+                raise RequestError(f'Length must be between 1 and {MAX_STRING_LENGTH}')
+            if not char_types:
+                raise RequestError('At least one character type must be selected')
+            charset = generator._build_charset(char_types)
+            self.build = lambda reader, n: generator.build_strings(reader, n, length, charset)
+            self.item_cost = generator.string_cost(length, 1, len(charset))
+        else:
+            word_count, capitalize_words, separate_with_dashes, add_digit, wordlist = parse_passphrase_options(data)
+            words = generator.get_wordlist(wordlist)
+            self.build = lambda reader, n: [
+                generator.build_passphrase(
+                    reader, words, word_count, capitalize_words, separate_with_dashes, add_digit
+                )
+                for _ in range(n)
+            ]
+            self.item_cost = generator.passphrase_cost(word_count, len(words), add_digit)
+    
+    @property
+    def mimetype(self) -> str:
+        return 'application/x-ndjson' if self.output_format == 'ndjson' else 'text/plain'
+    
+    def lines(self, client: str):
+        """Generate the response body block by block, ending with a summary line."""
+        reader = generator.open_reader()
+        produced = 0
+        try:
+            # Generate in blocks so sampling is vectorized but memory stays bounded
+            while produced < self.count:
+                block = min(BULK_BLOCK_SIZE, self.count - produced)
+                # The whole batch was charged up front, so a rejection refunds what is left of it
+                unproduced_cost = self.item_cost * (self.count - produced)
+                # The bulk request counts once towards the reseed budget, on its first block
+                usage = generator._record_usage(reader, requests=0 if produced else 1)
+                with admission.slot(client, self.item_cost * block, unproduced_cost), usage:
+                    values = self.build(reader, block)
+                produced += len(values)
+                if self.output_format == 'ndjson':
+                    yield ''.join(json.dumps({self.kind: value}) + '\n' for value in values)
+                else:
+                    yield ''.join(value + '\n' for value in values)
+        except Exception as e:
+            logger.error(f"Error in generate-bulk stream after {produced} items: {e}")
+            if self.output_format == 'ndjson':
+                yield json.dumps({'error': str(e)}) + '\n'
+            else:
+                yield f"# error: {e}\n"
         
-        # Generate strings
-        results = []
-        for _ in range(count):
-            random_string = generator.generate_random_string(length, char_types)
-            results.append(random_string)
+        summary = {
+            'count': produced,
+            'snapshots_used': reader.snapshots_used,
+            'entropy_bytes': reader.bytes_drawn
+        }
+        if self.output_format == 'ndjson':
+            yield json.dumps({'summary': summary}) + '\n'
+        else:
+            yield '# ' + ' '.join(f"{key}={value}" for key, value in summary.items()) + '\n'
+
+@app.route('/generate', methods=['POST'])
+def generate():
+    try:
+        length, count, char_types = parse_string_options(request.json)
+        
+        # Charge the expected snapshot cost up front; the pool check replaces the old count check
+        with admission.admit(string_request_cost(length, count, char_types)):
+            # One reader for the whole request, so it joins a single coalesced group
+            results = generator.generate_random_strings(length, count, char_types)
         
         return jsonify({'strings': results})
         
+    except RequestError as e:
+        return jsonify({'error': str(e)}), 400
+    except AdmissionRejected as e:
+        return e.response()
+    except EntropyExhaustedError:
+        return admission.exhausted().response()
     except Exception as e:
         logger.error(f"Error in generate endpoint: {e}")
         return jsonify({'error': str(e)}), 500
@@ -353,64 +1938,170 @@ def generate():
 @app.route('/generate-passphrase', methods=['POST'])
 def generate_passphrase():
     try:
-        data = request.json
-        word_count = int(data.get('wordCount', 4))
-        capitalize_words = bool(data.get('capitalizeWords', True))
-        separate_with_dashes = bool(data.get('separateWithDashes', False))
-        add_digit = bool(data.get('addDigit', False))
-        
-        # Validate inputs
-        if word_count < 3 or word_count > 12:
-            return jsonify({'error': 'Word count must be between 3 and 12'}), 400
+        word_count, capitalize_words, separate_with_dashes, add_digit, wordlist = parse_passphrase_options(request.json)
         
-        # Generate passphrase
-        passphrase = generator.generate_passphrase(
-            word_count, capitalize_words, separate_with_dashes, add_digit
-        )
+        with admission.admit(passphrase_request_cost(word_count, add_digit, wordlist)):
+            # Generate passphrase
+            passphrase = generator.generate_passphrase(
+                word_count, capitalize_words, separate_with_dashes, add_digit, wordlist
+            )
         
         return jsonify({'passphrase': passphrase})
         
+    except RequestError as e:
+        return jsonify({'error': str(e)}), 400
+    except AdmissionRejected as e:
+        return e.response()
+    except EntropyExhaustedError:
+        return admission.exhausted().response()
     except Exception as e:
         logger.error(f"Error in generate-passphrase endpoint: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/health')
-def health():
+@app.route('/generate-bulk', methods=['POST'])
+def generate_bulk():
+    """Stream a large batch of strings or passphrases as NDJSON or plain text."""
     try:
-        available_snapshots = generator.get_available_entropy_count()
-        total_snapshots = len(list(RANDOMNESS_SOURCE.glob("*")))
+        plan = BulkPlan(request.json)
         
-        status = 'healthy'
-        if available_snapshots == 0:
-            status = 'critical'
-        elif available_snapshots <= 5:
-            status = 'warning'
+        # The whole batch is charged before streaming starts; each block then queues for its turn
+        client = admission.check(plan.item_cost * plan.count)
         
-        return jsonify({
-            'status': status,
-            'available_snapshots': available_snapshots,
-            'total_snapshots': total_snapshots,
-            'used_snapshots': len(generator.used_files)
-        })
+    except RequestError as e:
+        return jsonify({'error': str(e)}), 400
+    except AdmissionRejected as e:
+        return e.response()
+    except Exception as e:
+        logger.error(f"Error in generate-bulk endpoint: {e}")
+        return jsonify({'error': str(e)}), 500
+    
+    return Response(stream_with_context(plan.lines(client)), mimetype=plan.mimetype)
+
+def health_status() -> Dict:
+    """Current health, built from in-memory counters so it is O(1) to serve."""
+    available_snapshots = generator.get_available_entropy_count()
+    
+    status = 'healthy'
+    if available_snapshots == 0:
+        status = 'critical'
+    elif available_snapshots <= 5:
+        status = 'warning'
+    
+    prefetcher = generator.prefetcher
+    return {
+        'status': status,
+        'available_snapshots': available_snapshots,
+        'total_snapshots': generator.get_total_snapshot_count(),
+        'used_snapshots': generator.consumed_snapshots,
+        'prefetched_digests': prefetcher.buffered if prefetcher is not None else 0,
+        'prefetch_depth': prefetcher.depth if prefetcher is not None else 0,
+        'token_queues': generator.tokens.levels() if generator.tokens is not None else {},
+        'inflow_rate': round(depletion.inflow_rate, 3)
+    }
+
+@app.route('/health')
+def health():
+    try:
+        return jsonify(health_status())
     except Exception as e:
         return jsonify({
             'status': 'unhealthy',
             'error': str(e)
         }), 500
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics; aggregated over all workers when PROMETHEUS_MULTIPROC_DIR is set."""
+    registry = REGISTRY
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+health_stream_clients = 0
+health_stream_lock = threading.Lock()
+
+class HealthEvents:
+    """
+    The events of one /health/stream: the health status whenever it changes,
+    otherwise a keepalive comment every HEALTH_KEEPALIVE_INTERVAL. Shared by
+    the threaded and asyncio servers, which only differ in how they wait.
+    """
+
+    RETRY = "retry: 2000\n\n"
+
+    def __init__(self):
+        # Close after a while so workers are not held forever; browsers reconnect on their own
+        self.deadline = time.monotonic() + HEALTH_STREAM_MAX_AGE
+        self._last_payload = None
+        self._last_sent = 0.0
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.deadline
+
+    def next_event(self) -> Optional[str]:
+        """The event to send now, or None if nothing changed and no keepalive is due."""
+        try:
+            payload = json.dumps(health_status())
+        except Exception as e:
+            payload = json.dumps({'status': 'unhealthy', 'error': str(e)})
+        now = time.monotonic()
+        if payload != self._last_payload:
+            self._last_payload = payload
+            self._last_sent = now
+            return f"data: {payload}\n\n"
+        if now - self._last_sent >= HEALTH_KEEPALIVE_INTERVAL:
+            self._last_sent = now
+            return ": keepalive\n\n"
+        return None
+
+@app.route('/health/stream')
+def health_stream():
+    """Server-Sent Events stream pushing the health status whenever the pool level changes."""
+    global health_stream_clients
+    # Every open stream holds a worker thread, so only a few are allowed per worker
+    with health_stream_lock:
+        if health_stream_clients >= HEALTH_STREAM_MAX_CLIENTS:
+            return jsonify({'error': 'Too many health streams, poll /health instead'}), 503
+        health_stream_clients += 1
+    
+    def generate():
+        events = HealthEvents()
+        version = generator.changes.version
+        yield HealthEvents.RETRY
+        while not events.expired:
+            event = events.next_event()
+            if event is not None:
+                yield event
+            # Coalesce bursts of changes, e.g. during bulk generation
+            time.sleep(HEALTH_PUSH_INTERVAL)
+            # Seeds are published by another process, so also re-check periodically
+            version = generator.changes.wait(version, 1.0)
+    
+    def release():
+        global health_stream_clients
+        with health_stream_lock:
+            health_stream_clients -= 1
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(release)
+    return response
+
 @app.route('/api/string')
 def api_string():
     """API endpoint: Generate a single 32-character random string (A-Z, a-z, 0-9)"""
     try:
-        # Fixed parameters for API endpoint
-        length = 32
-        char_types = ['uppercase', 'lowercase', 'numbers']
-        
-        # Generate string
-        random_string = generator.generate_random_string(length, char_types)
+        # Fixed shape, usually served straight from the token queue
+        random_string = admission.take_fixed(generator.take_fixed_string, "string", fixed_string_cost())
         
         return jsonify({'string': random_string})
         
+    except AdmissionRejected as e:
+        return e.response()
+    except EntropyExhaustedError:
+        return admission.exhausted().response()
     except Exception as e:
         logger.error(f"Error in API string endpoint: {e}")
         return jsonify({'error': str(e)}), 500
@@ -419,19 +2110,15 @@ def api_string():
 def api_passphrase():
     """API endpoint: Generate a 3-word passphrase, capitalized, with dashes and one digit"""
     try:
-        # Fixed parameters for API endpoint
-        word_count = 3
-        capitalize_words = True
-        separate_with_dashes = True
-        add_digit = True
-        
-        # Generate passphrase
-        passphrase = generator.generate_passphrase(
-            word_count, capitalize_words, separate_with_dashes, add_digit
-        )
+        # Fixed shape, usually served straight from the token queue
+        passphrase = admission.take_fixed(generator.take_fixed_passphrase, "passphrase", fixed_passphrase_cost())
         
         return jsonify({'passphrase': passphrase})
         
+    except AdmissionRejected as e:
+        return e.response()
+    except EntropyExhaustedError:
+        return admission.exhausted().response()
     except Exception as e:
         logger.error(f"Error in API passphrase endpoint: {e}")
         return jsonify({'error': str(e)}), 500
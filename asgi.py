@@ -0,0 +1,416 @@
+"""
+Asyncio (ASGI) serving mode for app.py:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+    gunicorn -k uvicorn.workers.UvicornWorker --workers 4 asgi:app
+
+The entropy routes run on the event loop. Snapshot reads, hashing and
+generation run in a bounded thread pool, and requests that find the pool
+empty are parked on an asyncio event until new snapshots arrive or
+ASYNC_ENTROPY_WAIT expires, so a waiting client costs a coroutine rather
+than a thread. Pages, static files and /metrics are served by the Flask app
+in the same pool, so routes and JSON formats are the same in both modes.
+"""
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import functools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from werkzeug.datastructures import Headers
+# app loads .env, which has to happen before prometheus_client is imported
+from app import (APP_PORT, HEALTH_PUSH_INTERVAL, REQUEST_LATENCY, AdmissionRejected, BulkPlan, ChangeNotifier,
+                 EntropyExhaustedError, HealthEvents, RequestError, admission, app as flask_app, current_request_type,
+                 fixed_passphrase_cost, fixed_string_cost, generator, health_status, parse_passphrase_options,
+                 parse_string_options, passphrase_request_cost, string_request_cost)
+from prometheus_client import Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+ASYNC_EXECUTOR_WORKERS = int(os.getenv("ASYNC_EXECUTOR_WORKERS", "16"))
+ASYNC_ENTROPY_WAIT = float(os.getenv("ASYNC_ENTROPY_WAIT", "10"))
+MAX_BODY_SIZE = 1024 * 1024
+
+PARKED_REQUESTS = Gauge("random_async_parked_requests", "Requests parked waiting for entropy",
+                        multiprocess_mode="livesum")
+PARKED_SECONDS = Histogram("random_async_parked_seconds", "Time requests spent parked waiting for entropy",
+                           buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+
+class EntropyWaiter:
+    """
+    Lets coroutines wait for the pool to change without holding a thread.
+    One thread follows the generator's change notifier and wakes every
+    parked coroutine at once through an asyncio event. It also wakes them
+    once a second, since seeds published by another process are not notified.
+    """
+
+    def __init__(self, changes: ChangeNotifier):
+        self.changes = changes
+        self.parked = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._event: Optional[asyncio.Event] = None
+
+    def _start(self):
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+        threading.Thread(target=self._follow, name="entropy-waiter", daemon=True).start()
+
+    def _follow(self):
+        version = self.changes.version
+        while True:
+            version = self.changes.wait(version, 1.0)
+            if self.parked:
+                self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        event, self._event = self._event, asyncio.Event()
+        event.set()
+
+    async def wait(self, deadline: float) -> bool:
+        """Park until the pool changes; returns False once the deadline (loop time) has passed."""
+        if self._loop is None:
+            self._start()
+        remaining = deadline - self._loop.time()
+        if remaining <= 0:
+            return False
+        self.parked += 1
+        try:
+            await asyncio.wait_for(self._event.wait(), remaining)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.parked -= 1
+
+class AsyncEntropy:
+    """Awaitable access to the generator: blocking work goes to the executor, waits for entropy are parked."""
+
+    def __init__(self, executor: ThreadPoolExecutor, waiter: EntropyWaiter):
+        self.executor = executor
+        self.waiter = waiter
+
+    async def run(self, func: Callable, *args):
+        """Run blocking work in the executor, keeping the request type the metrics are attributed to."""
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, functools.partial(context.run, func, *args)
+        )
+
+    async def park(self, deadline: float) -> bool:
+        """Wait for the pool to change; returns False once the deadline has passed."""
+        PARKED_REQUESTS.inc()
+        try:
+            return await self.waiter.wait(deadline)
+        finally:
+            PARKED_REQUESTS.dec()
+
+    async def wait_for_pool(self, cost: float, deadline: float):
+        """Park while direct mode has less entropy than cost; admission then decides on what is there."""
+        if generator.reservoir is not None:
+            return
+        started = None
+        while generator.get_available_entropy_count() < cost:
+            if started is None:
+                started = time.perf_counter()
+            if not await self.park(deadline):
+                break
+        if started is not None:
+            PARKED_SECONDS.observe(time.perf_counter() - started)
+
+    async def generate(self, client: str, cost: float, func: Callable, *args):
+        """Admit a request of the given snapshot cost and run func(*args) for it, parking while entropy is short."""
+        deadline = asyncio.get_running_loop().time() + ASYNC_ENTROPY_WAIT
+        await self.wait_for_pool(cost, deadline)
+        client = admission.check(cost, client=client)
+        while True:
+            try:
+                return await self.run(self._admitted, client, cost, func, *args)
+            except EntropyExhaustedError:
+                # Another worker took the last snapshots first; wait for more instead of failing
+                if not await self.park(deadline):
+                    raise
+
+    async def take_fixed(self, client: str, take: Callable, profile: str, cost: float) -> str:
+        """A fixed-shape request: a ready token is popped without a fair-queue slot, otherwise it is generated."""
+        if generator.tokens_ready(profile):
+            return await self.run(admission.take_fixed, take, profile, cost, client)
+        return await self.generate(client, cost, take)
+
+    @staticmethod
+    def _admitted(client: str, cost: float, func: Callable, *args):
+        with admission.slot(client, cost):
+            return func(*args)
+
+executor = ThreadPoolExecutor(ASYNC_EXECUTOR_WORKERS, thread_name_prefix="entropy")
+entropy = AsyncEntropy(executor, EntropyWaiter(generator.changes))
+
+class Request:
+    def __init__(self, scope: Dict, body: bytes, receive: Callable):
+        self.scope = scope
+        self.body = body
+        self.receive = receive
+        self.headers = Headers([(name.decode("latin-1"), value.decode("latin-1")) for name, value in scope["headers"]])
+        remote_addr = scope["client"][0] if scope.get("client") else None
+        self.client = admission.client_id(self.headers, remote_addr)
+        self.disconnected = False
+
+    def json(self) -> Dict:
+        return json.loads(self.body)
+
+    def watch_disconnect(self):
+        """Notice the client going away while a response is streamed."""
+        async def watch():
+            while (await self.receive())["type"] != "http.disconnect":
+                pass
+            self.disconnected = True
+        return asyncio.ensure_future(watch())
+
+class Response:
+    def __init__(self, body: bytes = b"", status: int = 200, content_type: str = "application/json",
+                 headers: Optional[List[Tuple[str, str]]] = None, stream=None):
+        self.body = body
+        self.status = status
+        self.content_type = content_type
+        self.headers = headers or []
+        # Async iterator of str chunks, sent as they are produced
+        self.stream = stream
+
+    async def send(self, send: Callable, request: Request):
+        headers = [(b"content-type", self.content_type.encode())]
+        headers += [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in self.headers]
+        if self.stream is None:
+            headers.append((b"content-length", str(len(self.body)).encode()))
+        await send({"type": "http.response.start", "status": self.status, "headers": headers})
+        if self.stream is None:
+            await send({"type": "http.response.body", "body": self.body})
+            return
+
+        watcher = request.watch_disconnect()
+        try:
+            async for chunk in self.stream:
+                if request.disconnected:
+                    break
+                await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            watcher.cancel()
+            await self.stream.aclose()
+
+def json_response(data: Dict, status: int = 200, headers: Optional[List[Tuple[str, str]]] = None) -> Response:
+    # Same encoding as Flask's jsonify
+    body = json.dumps(data, separators=(",", ":"), sort_keys=True) + "\n"
+    return Response(body.encode(), status, headers=headers)
+
+def rejection_response(e: AdmissionRejected) -> Response:
+    return json_response({'error': str(e), 'retry_after': e.retry_after}, e.status,
+                         [('Retry-After', str(e.retry_after))])
+
+async def api_string(request: Request) -> Response:
+    """Generate a single 32-character random string (A-Z, a-z, 0-9)"""
+    random_string = await entropy.take_fixed(request.client, generator.take_fixed_string, "string",
+                                             fixed_string_cost())
+    return json_response({'string': random_string})
+
+async def api_passphrase(request: Request) -> Response:
+    """Generate a 3-word passphrase, capitalized, with dashes and one digit"""
+    # Sizing the wordlist may reload it from disk, so keep it off the event loop
+    cost = await entropy.run(fixed_passphrase_cost)
+    passphrase = await entropy.take_fixed(request.client, generator.take_fixed_passphrase, "passphrase", cost)
+    return json_response({'passphrase': passphrase})
+
+async def generate(request: Request) -> Response:
+    length, count, char_types = parse_string_options(request.json())
+    results = await entropy.generate(request.client, string_request_cost(length, count, char_types),
+                                     generator.generate_random_strings, length, count, char_types)
+    return json_response({'strings': results})
+
+async def generate_passphrase(request: Request) -> Response:
+    word_count, capitalize_words, separate_with_dashes, add_digit, wordlist = parse_passphrase_options(request.json())
+    # Looking up the wordlist may reload it from disk
+    cost = await entropy.run(passphrase_request_cost, word_count, add_digit, wordlist)
+    passphrase = await entropy.generate(request.client, cost, generator.generate_passphrase,
+                                        word_count, capitalize_words, separate_with_dashes, add_digit, wordlist)
+    return json_response({'passphrase': passphrase})
+
+async def generate_bulk(request: Request) -> Response:
+    """Stream a large batch of strings or passphrases as NDJSON or plain text."""
+    plan = await entropy.run(BulkPlan, request.json())
+    cost = plan.item_cost * plan.count
+    # The batch streams as entropy comes in, so it only waits while the pool is empty;
+    # it is charged before streaming starts and each block then queues for its turn
+    await entropy.wait_for_pool(min(cost, 1), asyncio.get_running_loop().time() + ASYNC_ENTROPY_WAIT)
+    client = admission.check(cost, client=request.client)
+
+    async def stream():
+        lines = plan.lines(client)
+        try:
+            while True:
+                chunk = await entropy.run(next, lines, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            # Stops generating, and drawing entropy, when the client goes away
+            await entropy.run(lines.close)
+
+    return Response(content_type=plan.mimetype, stream=stream())
+
+async def health(request: Request) -> Response:
+    return json_response(health_status())
+
+async def health_stream(request: Request) -> Response:
+    """Server-Sent Events stream pushing the health status whenever the pool level changes."""
+    # A stream is a parked coroutine here, so there is no per-worker client limit
+    async def stream():
+        loop = asyncio.get_running_loop()
+        events = HealthEvents()
+        yield HealthEvents.RETRY
+        while not events.expired:
+            event = events.next_event()
+            if event is not None:
+                yield event
+            # Coalesce bursts of changes, e.g. during bulk generation
+            await asyncio.sleep(HEALTH_PUSH_INTERVAL)
+            # The event deadline is on time.monotonic(), the loop's clock too
+            await entropy.waiter.wait(min(events.deadline, loop.time() + 1.0))
+
+    return Response(content_type="text/event-stream", stream=stream(),
+                    headers=[('Cache-Control', 'no-cache'), ('X-Accel-Buffering', 'no')])
+
+# Routes served on the event loop, named like their Flask endpoints; everything else goes to Flask
+ROUTES = {
+    ("GET", "/api/string"): ("api_string", api_string),
+    ("GET", "/api/passphrase"): ("api_passphrase", api_passphrase),
+    ("POST", "/generate"): ("generate", generate),
+    ("POST", "/generate-passphrase"): ("generate_passphrase", generate_passphrase),
+    ("POST", "/generate-bulk"): ("generate_bulk", generate_bulk),
+    ("GET", "/health"): ("health", health),
+    ("GET", "/health/stream"): ("health_stream", health_stream),
+}
+
+async def handle(name: str, handler: Callable, request: Request) -> Response:
+    """Run a route, mapping errors to the same responses the Flask routes give."""
+    try:
+        return await handler(request)
+    except RequestError as e:
+        return json_response({'error': str(e)}, 400)
+    except AdmissionRejected as e:
+        return rejection_response(e)
+    except EntropyExhaustedError:
+        return rejection_response(admission.exhausted())
+    except Exception as e:
+        logger.error(f"Error in {name} endpoint: {e}")
+        return json_response({'error': str(e)}, 500)
+
+def wsgi_environ(scope: Dict, body: bytes) -> Dict:
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": scope["path"],
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": scope["client"][0] if scope.get("client") else "",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        key = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = f"HTTP_{key}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+def call_flask(environ: Dict) -> Tuple[int, List[Tuple[str, str]], bytes]:
+    """Serve one request with the Flask app; its routes here all return complete bodies."""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = headers
+
+    result = flask_app(environ, start_response)
+    try:
+        body = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return started["status"], started["headers"], body
+
+async def read_body(receive: Callable) -> Optional[bytes]:
+    """The whole request body, or None if it is larger than MAX_BODY_SIZE."""
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_SIZE:
+            return None
+        if not message.get("more_body", False):
+            break
+    return bytes(body)
+
+async def lifespan(receive: Callable, send: Callable):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope: Dict, receive: Callable, send: Callable):
+    """ASGI entry point."""
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    body = await read_body(receive)
+    route = ROUTES.get((scope["method"], scope["path"]))
+    if body is None:
+        response = json_response({'error': 'Request body too large'}, 413)
+        await response.send(send, Request(scope, b"", receive))
+        return
+
+    if route is None:
+        status, headers, content = await entropy.run(call_flask, wsgi_environ(scope, body))
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+        })
+        await send({"type": "http.response.body", "body": content})
+        return
+
+    name, handler = route
+    started = time.perf_counter()
+    token = current_request_type.set(name)
+    try:
+        request = Request(scope, body, receive)
+        response = await handle(name, handler, request)
+        REQUEST_LATENCY.labels(name, scope["method"], str(response.status)).observe(time.perf_counter() - started)
+        await response.send(send, request)
+    finally:
+        current_request_type.reset(token)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=APP_PORT)
@@ -0,0 +1,579 @@
+"""
+Micro-benchmarks for the entropy hot paths in app.py, plus an HTTP load
+test against a server fed by a synthetic snapshot source instead of a camera.
+
+Usage: python benchmark.py [section ...] [options]
+       python benchmark.py --help
+"""
+import os
+import sys
+import json
+import hmac
+import math
+import time
+import hashlib
+import socket
+import timeit
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+# The benchmarks get their own snapshot directory, and time the synchronous
+# read path, so app.py must not see the real pool or prefetch or pre-generate in the background
+SERVER_ENV = dict(os.environ)
+BENCH_SOURCE = tempfile.TemporaryDirectory(prefix="random-bench-")
+os.environ["RANDOMNESS_SOURCE"] = BENCH_SOURCE.name
+os.environ["PREFETCH_DEPTH"] = "0"
+os.environ["TOKEN_QUEUE_DEPTH"] = "0"
+
+from app import (EntropyReader, HkdfStream, RequestCoalescer, SnapshotIndex, SNAPSHOT_READ_WORKERS,
+                 SNAPSHOT_RESCAN_INTERVAL, Wordlist, generator, hkdf_extract, indices_to_text, secure_random_indices)
+import capture_snapshots
+from capture_snapshots import (FRAME_ENCODE_SECONDS, FRAME_SCREEN_SECONDS, FRAME_WRITE_SECONDS, SNAPSHOT_BYTES,
+                               CaptureRateController, SnapshotCapture, SnapshotRetention)
+
+CHARSETS = {
+    "alphanumeric": generator._build_charset(["uppercase", "lowercase", "numbers"]),
+    "all": generator._build_charset(["uppercase", "lowercase", "numbers", "special"]),
+}
+LENGTHS = [32, 256, 65536]
+
+def legacy_secure_random_choice(entropy_pool: bytes, offset: int, choices: int) -> tuple[int, int]:
+    """The original byte-aligned rejection sampler, kept as a baseline."""
+    bytes_needed = ((choices - 1).bit_length() + 7) // 8
+    max_valid = (2 ** (bytes_needed * 8)) // choices * choices
+    while offset + bytes_needed <= len(entropy_pool):
+        value = int.from_bytes(entropy_pool[offset:offset + bytes_needed], 'big')
+        if value < max_valid:
+            return value % choices, bytes_needed
+        offset += 1
+    return entropy_pool[-1] % choices, 1
+
+def per_character(entropy_pool: bytes, charset: str, length: int) -> str:
+    """The original per-character sampling loop."""
+    result = []
+    entropy_offset = 0
+    for _ in range(length):
+        char_index, bytes_consumed = legacy_secure_random_choice(
+            entropy_pool, entropy_offset, len(charset)
+        )
+        result.append(charset[char_index])
+        entropy_offset += bytes_consumed
+        if entropy_offset >= len(entropy_pool):
+            break
+    return ''.join(result)
+
+def vectorized(entropy_pool: bytes, charset: str, length: int) -> str:
+    indices, _ = secure_random_indices(entropy_pool, len(charset), length)
+    return indices_to_text(charset, indices)
+
+def time_call(func, *args) -> float:
+    """Best-of-5 time per call in microseconds."""
+    number = max(1, 20000 // args[-1])
+    return min(timeit.repeat(lambda: func(*args), number=number, repeat=5)) / number * 1e6
+
+def bench_sampling():
+    print("String sampling (us per string, best of 5)")
+    print(f"{'charset':<14}{'length':>8}{'per-char':>14}{'vectorized':>14}{'speedup':>10}")
+    for name, charset in CHARSETS.items():
+        for length in LENGTHS:
+            entropy_pool = os.urandom(length * 2)
+            baseline = time_call(per_character, entropy_pool, charset, length)
+            candidate = time_call(vectorized, entropy_pool, charset, length)
+            print(f"{name:<14}{length:>8}{baseline:>14.1f}{candidate:>14.1f}{baseline / candidate:>9.1f}x")
+
+def urandom_reader() -> EntropyReader:
+    return EntropyReader(lambda num_bytes: (os.urandom(num_bytes), 1), 32)
+
+def bench_entropy_usage():
+    print("Entropy used per item (bits, mean of 2000)")
+    print(f"{'item':<28}{'previous':>10}{'now':>10}{'ideal':>10}")
+    charset = CHARSETS["alphanumeric"]
+    reader = urandom_reader()
+    for _ in range(2000):
+        generator.build_string(reader, 32, charset)
+    # The previous allocation drew 2 bytes per character, i.e. two snapshots
+    previous = 32 * 2 * 8
+    ideal = 32 * math.log2(len(charset))
+    print(f"{'32-char alphanumeric':<28}{previous:>10}{reader.bits_used / 2000:>10.1f}{ideal:>10.1f}")
+    
+    words = generator.get_wordlist("default")
+    reader = urandom_reader()
+    for _ in range(2000):
+        generator.build_passphrase(reader, words, 3, True, True, True)
+    # The previous allocation drew 3 bytes per word plus 4 for the digit
+    previous = (3 * 3 + 4) * 8
+    ideal = 3 * math.log2(len(words)) + math.log2(3) + math.log2(10)
+    print(f"{'3-word passphrase + digit':<28}{previous:>10}{reader.bits_used / 2000:>10.1f}{ideal:>10.1f}")
+
+def claim_worker(directory: str) -> List[str]:
+    """Claim and delete snapshots until none are left, returning their names."""
+    index = SnapshotIndex(Path(directory), SNAPSHOT_RESCAN_INTERVAL)
+    index.rescan()
+    claimed = []
+    while True:
+        path = index.claim_oldest()
+        if path is None:
+            return claimed
+        claimed.append(path.name.partition('-')[2])
+        path.unlink()
+
+def bench_claims(processes: int = 8, snapshots: int = 5000):
+    """Hammer the claim protocol from several processes and check each snapshot is used once."""
+    print(f"Snapshot claiming ({processes} processes, {snapshots} snapshots)")
+    with tempfile.TemporaryDirectory() as directory:
+        for i in range(snapshots):
+            (Path(directory) / f"snapshot_{i:06d}.jpg").write_bytes(os.urandom(64))
+        
+        start = time.perf_counter()
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(claim_worker, [directory] * processes)
+        elapsed = time.perf_counter() - start
+    
+    names = [name for result in results for name in result]
+    duplicates = len(names) - len(set(names))
+    missing = snapshots - len(set(names))
+    status = "OK" if duplicates == 0 and missing == 0 else "FAILED"
+    print(f"{len(names) / elapsed:.0f} claims/s, per process {[len(r) for r in results]}")
+    print(f"duplicates={duplicates} missing={missing} {status}")
+    return status == "OK"
+
+def legacy_cleanup(directory: Path, max_snapshots: int):
+    """The original per-frame cleanup: glob, stat and sort the whole pool."""
+    snapshots = list(directory.glob("snapshot_*.jpg"))
+    if len(snapshots) > max_snapshots:
+        snapshots.sort(key=lambda x: x.stat().st_mtime)
+        for i in range(len(snapshots) - max_snapshots):
+            snapshots[i].unlink()
+
+def bench_retention(pool_sizes=(100, 1000, 5000), frames: int = 200):
+    """Per-frame retention overhead of the capture service as the pool grows."""
+    print("Capture retention overhead (us per frame, excluding the write)")
+    print(f"{'pool':>8}{'rescan':>12}{'in-memory':>12}")
+    for pool_size in pool_sizes:
+        timings = []
+        for incremental in (False, True):
+            with tempfile.TemporaryDirectory() as tmp:
+                directory = Path(tmp)
+                for i in range(pool_size):
+                    (directory / f"snapshot_{i:08d}.jpg").touch()
+                retention = SnapshotRetention(directory, pool_size)
+                retention.rebuild()
+                
+                elapsed = 0.0
+                for i in range(pool_size, pool_size + frames):
+                    name = f"snapshot_{i:08d}.jpg"
+                    (directory / name).touch()
+                    start = time.perf_counter()
+                    if incremental:
+                        retention.add(name)
+                        retention.evict()
+                    else:
+                        legacy_cleanup(directory, pool_size)
+                    elapsed += time.perf_counter() - start
+                timings.append(elapsed / frames * 1e6)
+        print(f"{pool_size:>8}{timings[0]:>12.0f}{timings[1]:>12.0f}")
+
+class SyntheticSnapshotSource:
+    """
+    Stands in for the camera: writes random snapshot files of a fixed size
+    into a directory at a steady rate, atomically like the capture service.
+    """
+
+    def __init__(self, directory: Path, rate: float, size: int):
+        self.directory = directory
+        self.rate = rate
+        self.size = size
+        self.written = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def write(self, count: int = 1):
+        for _ in range(count):
+            name = f"snapshot_{time.time_ns()}_{self.written:08d}.jpg"
+            tmp_path = self.directory / f".{name}.tmp"
+            tmp_path.write_bytes(os.urandom(self.size))
+            os.rename(tmp_path, self.directory / name)
+            self.written += 1
+
+    def start(self):
+        if self.rate > 0:
+            self._thread = threading.Thread(target=self._run, name="synthetic-source", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        next_write = time.monotonic()
+        while not self._stop.is_set():
+            self.write()
+            next_write += 1 / self.rate
+            self._stop.wait(max(0.0, next_write - time.monotonic()))
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+def bench_entropy_pool(sizes=(50_000, 200_000, 1_000_000), snapshots: int = 200):
+    """Time generate_entropy_pool (claim, read, hash and delete) per snapshot size."""
+    print(f"Entropy pool from snapshots (direct mode, {snapshots} snapshots per size, us per snapshot)")
+    print(f"{'size':>10}{'sequential':>12}{f'{SNAPSHOT_READ_WORKERS} threads':>12}{'MB/s':>10}")
+    directory = Path(BENCH_SOURCE.name)
+    read_pool = generator._read_pool
+    for size in sizes:
+        timings = []
+        for pool in (None, read_pool):
+            generator._read_pool = pool
+            SyntheticSnapshotSource(directory, 0, size).write(snapshots)
+            generator.snapshots.rescan()
+            start = time.perf_counter()
+            generator.generate_entropy_pool(32 * snapshots)
+            timings.append((time.perf_counter() - start) / snapshots)
+        print(f"{size:>10}{timings[0] * 1e6:>12.0f}{timings[1] * 1e6:>12.0f}{size / timings[1] / 1e6:>10.0f}")
+    generator._read_pool = read_pool
+
+def legacy_load_wordlist(path: Path) -> List[str]:
+    """The original wordlist loading: one Python string per word."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+def bench_wordlists(sizes=(7776, 1_000_000)):
+    """Time loading wordlists and looking up words, against the list-of-strings baseline."""
+    print("Wordlist loading (ms) and lookup (ns per word)")
+    print(f"{'words':>10}{'list load':>12}{'offset load':>12}{'lookup':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = Path(tmp) / f"words_{size}.txt"
+            path.write_text(''.join(f"word{i:07d}\n" for i in range(size)))
+            baseline = min(timeit.repeat(lambda: legacy_load_wordlist(path), number=1, repeat=3)) * 1e3
+            candidate = min(timeit.repeat(lambda: Wordlist("bench", path, 30), number=1, repeat=3)) * 1e3
+            words = Wordlist("bench", path, 30).get()
+            lookup = min(timeit.repeat(lambda: words.word(size // 2), number=10000, repeat=3)) / 10000 * 1e9
+            print(f"{size:>10}{baseline:>12.1f}{candidate:>12.1f}{lookup:>10.0f}")
+
+LOAD_REQUESTS = {
+    "/generate": ("POST", {"length": 32, "count": 1, "charTypes": ["uppercase", "lowercase", "numbers"]}),
+    "/generate-passphrase": ("POST", {"wordCount": 4, "addDigit": True}),
+    "/api/string": ("GET", None),
+    "/api/passphrase": ("GET", None),
+}
+
+def rfc5869_expand(prk: bytes, info: bytes, length: int) -> bytes:
+    """Reference HKDF-Expand, straight from RFC 5869."""
+    okm, block = b"", b""
+    for counter in range(1, -(-length // 32) + 1):
+        block = hmac.new(prk, block + info + bytes([counter]), hashlib.sha256).digest()
+        okm += block
+    return okm[:length]
+
+def bench_coalesce(args, requests_per_client: int = 200, draw_seconds: float = 0.001):
+    """
+    Check the HKDF streams against RFC 5869, then compare concurrent single
+    requests each taking the lock for their own draw with requests coalesced
+    onto shared seeds. Draws are simulated and take draw_seconds, about what
+    reading and hashing a snapshot costs.
+    """
+    # RFC 5869 test case 1
+    prk = hkdf_extract(bytes(range(13)), b"\x0b" * 22)
+    vector_ok = (
+        prk.hex() == "077709362c2e32df0ddc3f0dc47bba6390b6c73bb50f9c3122ec844ad7c2b3e5"
+        and rfc5869_expand(prk, bytes(range(0xf0, 0xfa)), 42).hex()
+        == "3cb25f25faacd57a90434f64d0362f2a2d2d0a90cf1a5a4c5db02d56ecc4c5bf34007208d5b887185865"
+    )
+    segment = HkdfStream.MAX_BLOCKS * 32
+    stream_ok = HkdfStream(prk, b"ctx").read(segment + 100) == (
+        rfc5869_expand(prk, b"ctx" + (0).to_bytes(4, "big"), segment)
+        + rfc5869_expand(prk, b"ctx" + (1).to_bytes(4, "big"), 100)
+    )
+    print(f"HKDF-SHA256: RFC 5869 vector {'OK' if vector_ok else 'FAILED'}, "
+          f"segmented stream {'OK' if stream_ok else 'FAILED'}")
+    ok = vector_ok and stream_ok
+    
+    clients = max(args.concurrency)
+    print(f"Request coalescing ({clients} clients x {requests_per_client} requests, "
+          f"{draw_seconds * 1e3:g} ms per draw)")
+    print(f"{'window ms':>10}{'req/s':>10}{'draws/req':>11}{'p99 ms':>10}{'unique':>8}")
+    for window in (0, 0.001, 0.005):
+        lock = threading.Lock()
+        draws = 0
+        
+        def draw(num_bytes):
+            nonlocal draws
+            with lock:
+                draws += 1
+                time.sleep(draw_seconds)
+                return os.urandom(num_bytes), 1
+        
+        coalescer = RequestCoalescer(draw, window, 64) if window else None
+        
+        def client():
+            outputs, latencies = [], []
+            for _ in range(requests_per_client):
+                start = time.perf_counter()
+                reader = EntropyReader(coalescer.join().draw if coalescer else draw, 32)
+                outputs.append(reader.read_bits(256))
+                latencies.append(time.perf_counter() - start)
+            return outputs, latencies
+        
+        start = time.perf_counter()
+        with ThreadPoolExecutor(clients) as pool:
+            results = list(pool.map(lambda _: client(), range(clients)))
+        elapsed = time.perf_counter() - start
+        outputs = [value for result in results for value in result[0]]
+        latencies = sorted(latency for result in results for latency in result[1])
+        unique = "OK" if len(set(outputs)) == len(outputs) else "FAILED"
+        ok = ok and unique == "OK"
+        print(f"{window * 1e3:>10g}{len(outputs) / elapsed:>10.0f}{draws / len(outputs):>11.3f}"
+              f"{_percentile(latencies, 0.99) * 1e3:>10.1f}{unique:>8}")
+    return ok
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _request(url: str, method: str, body) -> int:
+    """Send one request and return its status code, 0 if it never got a response."""
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code
+    except urllib.error.URLError:
+        return 0
+
+def _snapshots_consumed(base_url: str) -> Dict[str, float]:
+    """Read the per-endpoint snapshot counters from the server's /metrics."""
+    consumed = {}
+    with urllib.request.urlopen(f"{base_url}/metrics", timeout=10) as response:
+        for line in response.read().decode().splitlines():
+            if line.startswith("random_snapshots_consumed_total{"):
+                labels, _, value = line.rpartition(" ")
+                endpoint = labels.split('request_type="', 1)[1].split('"', 1)[0]
+                consumed[endpoint] = float(value)
+    return consumed
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def run_load_level(base_url: str, path: str, concurrency: int, duration: float):
+    """
+    Send requests from concurrency threads for duration seconds; returns the
+    latencies of successful requests and counts of 429s, 503s and other errors.
+    """
+    method, body = LOAD_REQUESTS[path]
+    deadline = time.monotonic() + duration
+    
+    def client():
+        latencies, rejected, unavailable, errors = [], 0, 0, 0
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            status = _request(base_url + path, method, body)
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            elif status == 429:
+                rejected += 1
+            elif status == 503:
+                unavailable += 1
+            else:
+                errors += 1
+        return latencies, rejected, unavailable, errors
+    
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(lambda _: client(), range(concurrency)))
+    latencies = sorted(latency for result in results for latency in result[0])
+    return latencies, *(sum(result[i] for result in results) for i in range(1, 4))
+
+def bench_load(args):
+    """Drive the HTTP endpoints at increasing concurrency against a server fed by synthetic snapshots."""
+    with tempfile.TemporaryDirectory(prefix="random-load-") as tmp:
+        directory = Path(tmp) / "source"
+        metrics_dir = Path(tmp) / "metrics"
+        directory.mkdir()
+        metrics_dir.mkdir()
+        
+        source = SyntheticSnapshotSource(directory, args.rate, args.size)
+        source.write(args.prefill)
+        source.start()
+        
+        port = _free_port()
+        # Admission control would turn most of the load away; enable it with --server-env to measure it
+        env = dict(SERVER_ENV, RANDOMNESS_SOURCE=str(directory), PROMETHEUS_MULTIPROC_DIR=str(metrics_dir),
+                   ADMISSION_CONTROL="false")
+        for item in args.server_env:
+            key, _, value = item.partition("=")
+            env[key] = value
+        if args.server == "async":
+            server_args = ["--worker-class", "uvicorn.workers.UvicornWorker", "asgi:app"]
+        else:
+            server_args = ["--threads", str(max(args.concurrency)), "app:app"]
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "--workers", str(args.workers),
+             "--bind", f"127.0.0.1:{port}", "--log-level", "warning", *server_args],
+            cwd=Path(__file__).parent, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            for _ in range(100):
+                try:
+                    urllib.request.urlopen(f"{base_url}/health", timeout=1).read()
+                    break
+                except (urllib.error.URLError, ConnectionError):
+                    time.sleep(0.2)
+            else:
+                raise RuntimeError("Server did not start")
+            
+            print(f"HTTP load ({args.workers} {args.server} workers, {args.duration:g}s per level, "
+                  f"{args.prefill} snapshots prefilled, {args.rate:g}/s of {args.size} bytes)")
+            print(f"{'endpoint':<22}{'clients':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+                  f"{'429':>6}{'503':>6}{'errors':>8}{'snaps/req':>11}")
+            for path in LOAD_REQUESTS:
+                endpoint = path.strip("/").replace("-", "_").replace("/", "_")
+                for concurrency in args.concurrency:
+                    before = _snapshots_consumed(base_url).get(endpoint, 0.0)
+                    start = time.perf_counter()
+                    latencies, rejected, unavailable, errors = run_load_level(
+                        base_url, path, concurrency, args.duration
+                    )
+                    elapsed = time.perf_counter() - start
+                    used = _snapshots_consumed(base_url).get(endpoint, 0.0) - before
+                    if latencies:
+                        p50 = _percentile(latencies, 0.5) * 1e3
+                        p99 = _percentile(latencies, 0.99) * 1e3
+                        per_request = used / len(latencies)
+                        print(f"{path:<22}{concurrency:>8}{len(latencies) / elapsed:>10.0f}{p50:>10.1f}"
+                              f"{p99:>10.1f}{rejected:>6}{unavailable:>6}{errors:>8}{per_request:>11.2f}")
+                    else:
+                        print(f"{path:<22}{concurrency:>8}{0:>10}{'-':>10}{'-':>10}"
+                              f"{rejected:>6}{unavailable:>6}{errors:>8}{'-':>11}")
+        finally:
+            server.terminate()
+            server.wait()
+            source.stop()
+
+def _histogram_state(histogram):
+    """Cumulative bucket counts, sum and count of an unlabelled histogram."""
+    buckets, total, count = [], 0.0, 0.0
+    for sample in histogram.collect()[0].samples:
+        if sample.name.endswith("_bucket"):
+            buckets.append((float(sample.labels["le"]), sample.value))
+        elif sample.name.endswith("_sum"):
+            total = sample.value
+        elif sample.name.endswith("_count"):
+            count = sample.value
+    return buckets, total, count
+
+def _histogram_summary(before, after, quantile: float = 0.99):
+    """Mean and estimated quantile (interpolated within buckets, like histogram_quantile) between two states."""
+    count = after[2] - before[2]
+    if not count:
+        return 0.0, 0.0
+    mean = (after[1] - before[1]) / count
+    rank = quantile * count
+    lower_bound, lower_count = 0.0, 0.0
+    for (bound, cumulative), (_, previous) in zip(after[0], before[0]):
+        cumulative -= previous
+        if cumulative >= rank:
+            if math.isinf(bound):
+                return mean, lower_bound
+            return mean, lower_bound + (bound - lower_bound) * (rank - lower_count) / (cumulative - lower_count)
+        lower_bound, lower_count = bound, cumulative
+    return mean, lower_bound
+
+def bench_capture(args):
+    """Run the capture pipeline on replayed frames and report its throughput."""
+    # One line per snapshot would dominate the measurement
+    capture_snapshots.logger.setLevel("WARNING")
+    with tempfile.TemporaryDirectory(prefix="random-capture-") as tmp:
+        capture = SnapshotCapture([args.capture_source] * args.cameras, Path(tmp), args.capture_keep)
+        capture.encode_workers = args.encode_workers or capture.encode_workers
+        # Keep every frame the pipeline can take
+        capture.rate = CaptureRateController(0, 0, 0, 0, 0)
+        
+        encode_before = _histogram_state(FRAME_ENCODE_SECONDS)
+        screen_before = _histogram_state(FRAME_SCREEN_SECONDS)
+        write_before = _histogram_state(FRAME_WRITE_SECONDS)
+        bytes_before = SNAPSHOT_BYTES._value.get()
+        start = time.perf_counter()
+        capture.start()
+        time.sleep(args.capture_duration)
+        capture.stop()
+        elapsed = time.perf_counter() - start
+        
+        encode_mean, encode_p99 = _histogram_summary(encode_before, _histogram_state(FRAME_ENCODE_SECONDS))
+        screen_mean, screen_p99 = _histogram_summary(screen_before, _histogram_state(FRAME_SCREEN_SECONDS))
+        write_after = _histogram_state(FRAME_WRITE_SECONDS)
+        write_mean, write_p99 = _histogram_summary(write_before, write_after)
+        written = write_after[2] - write_before[2]
+        disk_bytes = SNAPSHOT_BYTES._value.get() - bytes_before
+        frames_read = sum(stream.frames for stream in capture.streams)
+        screened_out = sum(stream.screened_out for stream in capture.streams)
+    
+    print(f"Capture pipeline ({args.cameras} x {args.capture_source}, {capture.encode_workers} encoders, "
+          f"{args.capture_duration:g}s)")
+    print(f"frames read       {frames_read / elapsed:>10.1f} /s")
+    print(f"snapshots written {written / elapsed:>10.1f} /s  ({capture.frames.dropped} frames dropped by the queue)")
+    print(f"screened out      {screened_out / elapsed:>10.1f} /s  (duplicate or flat, never encoded)")
+    print(f"screen latency    {screen_mean * 1e3:>10.2f} ms mean, {screen_p99 * 1e3:.2f} ms p99")
+    print(f"encode latency    {encode_mean * 1e3:>10.2f} ms mean, {encode_p99 * 1e3:.2f} ms p99")
+    print(f"write latency     {write_mean * 1e3:>10.2f} ms mean, {write_p99 * 1e3:.2f} ms p99")
+    print(f"disk throughput   {disk_bytes / elapsed / 1e6:>10.1f} MB/s  ({disk_bytes / max(written, 1) / 1e3:.0f} KB per snapshot)")
+
+SECTIONS = {
+    "sampling": lambda args: bench_sampling(),
+    "entropy": lambda args: bench_entropy_usage(),
+    "pool": lambda args: bench_entropy_pool(),
+    "wordlists": lambda args: bench_wordlists(),
+    "claims": lambda args: bench_claims(),
+    "retention": lambda args: bench_retention(),
+    "coalesce": bench_coalesce,
+    "load": bench_load,
+    "capture": bench_capture,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sections", nargs="*", choices=[[]] + list(SECTIONS), metavar="section",
+                        help=f"sections to run: {', '.join(SECTIONS)} (default: all)")
+    parser.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 4, 16],
+                        help="comma-separated client counts for the load test (the largest is used by coalesce)")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per load level")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn workers for the load test")
+    parser.add_argument("--server", choices=["threaded", "async"], default="threaded",
+                        help="serve the load test with threaded Flask workers or the asyncio app")
+    parser.add_argument("--prefill", type=int, default=5000, help="synthetic snapshots written before the load test")
+    parser.add_argument("--rate", type=float, default=50.0, help="synthetic snapshots written per second")
+    parser.add_argument("--size", type=int, default=100_000, help="synthetic snapshot size in bytes")
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the server, e.g. ENTROPY_MODE=reservoir")
+    parser.add_argument("--capture-source", default="synthetic://1280x720?fps=0",
+                        help="frame source for the capture benchmark: synthetic://WxH?fps=N, file:///video?fps=N or a stream URL")
+    parser.add_argument("--cameras", type=int, default=1, help="concurrent copies of the capture source")
+    parser.add_argument("--encode-workers", type=int, default=0, help="capture encoder threads (default: ENCODE_WORKERS)")
+    parser.add_argument("--capture-duration", type=float, default=10.0, help="seconds to run the capture benchmark")
+    parser.add_argument("--capture-keep", type=int, default=200, help="snapshots kept on disk during the capture benchmark")
+    args = parser.parse_args()
+    
+    failed = []
+    for i, name in enumerate(args.sections or SECTIONS):
+        if i:
+            print()
+        # Sections that verify correctness return False on failure
+        if SECTIONS[name](args) is False:
+            failed.append(name)
+    if failed:
+        print(f"\nFailed: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
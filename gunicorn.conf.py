@@ -0,0 +1,31 @@
+"""
+Gunicorn server hooks, picked up automatically from the working directory.
+
+With PROMETHEUS_MULTIPROC_DIR set, every worker writes its metrics to files
+in that directory and /metrics aggregates them. The directory is emptied at
+startup so a previous run's values don't linger, and a worker that exits is
+marked dead so it drops out of the livesum/liveall gauges.
+"""
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Workers inherit the master's environment, so .env settings reach them too
+load_dotenv()
+
+def on_starting(server):
+    """Empty the metrics directory before any worker starts."""
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if not directory:
+        return
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    for metrics_file in path.glob("*.db"):
+        metrics_file.unlink()
+
+def child_exit(server, worker):
+    """Remove an exited worker's live gauge values from the aggregate."""
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid, directory)
@@ -0,0 +1,122 @@
+import os
+import mmap
+import fcntl
+import struct
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+SEED_SIZE = 32
+MAGIC = b"SEEDRING"
+VERSION = 1
+
+# magic, version, seed size, capacity, head (seeds written), tail (seeds consumed)
+HEADER = struct.Struct("<8sIIQQQ")
+HEADER_SIZE = 64
+HEAD_OFFSET = 24
+TAIL_OFFSET = 32
+COUNTER = struct.Struct("<Q")
+
+class SeedRing:
+    """
+    Fixed-size seed records in a memory-mapped ring file shared by the
+    capture service (single producer) and the web workers (consumers).
+    The head and tail counters live in the file header and only move while
+    holding an exclusive flock, so any number of processes can consume
+    without two of them ever getting the same seed. flock does not exclude
+    threads sharing the descriptor, so a thread lock is taken as well.
+    """
+
+    def __init__(self, path: Path, fd: int, buffer: mmap.mmap):
+        self.path = path
+        self._fd = fd
+        self._buffer = buffer
+        self._thread_lock = threading.Lock()
+        magic, version, seed_size, capacity, _, _ = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != VERSION or seed_size != SEED_SIZE:
+            raise ValueError(f"{path} is not a seed ring file")
+        self.capacity = capacity
+
+    @classmethod
+    def create(cls, path: Path, capacity: int) -> "SeedRing":
+        """Open the ring at path, creating it atomically if it does not exist."""
+        if not path.exists():
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.truncate(HEADER_SIZE + capacity * SEED_SIZE)
+                f.write(HEADER.pack(MAGIC, VERSION, SEED_SIZE, capacity, 0, 0))
+            os.rename(tmp_path, path)
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path: Path) -> Optional["SeedRing"]:
+        """Open an existing ring, or return None if it has not been created yet."""
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except FileNotFoundError:
+            return None
+        buffer = mmap.mmap(fd, 0)
+        return cls(path, fd, buffer)
+
+    def _counters(self):
+        head = COUNTER.unpack_from(self._buffer, HEAD_OFFSET)[0]
+        tail = COUNTER.unpack_from(self._buffer, TAIL_OFFSET)[0]
+        return head, tail
+
+    def _slot(self, sequence: int) -> int:
+        return HEADER_SIZE + (sequence % self.capacity) * SEED_SIZE
+
+    def append(self, seed: bytes) -> bool:
+        """Append one seed; when the ring is full the oldest seed is dropped. Returns True if one was."""
+        if len(seed) != SEED_SIZE:
+            raise ValueError(f"Seeds must be {SEED_SIZE} bytes")
+        with self._thread_lock:
+            return self._append(seed)
+
+    def _append(self, seed: bytes) -> bool:
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            head, tail = self._counters()
+            dropped = head - tail >= self.capacity
+            if dropped:
+                COUNTER.pack_into(self._buffer, TAIL_OFFSET, tail + 1)
+            slot = self._slot(head)
+            self._buffer[slot:slot + SEED_SIZE] = seed
+            COUNTER.pack_into(self._buffer, HEAD_OFFSET, head + 1)
+            return dropped
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def pop(self, max_seeds: int = 1) -> List[bytes]:
+        """Consume up to max_seeds seeds, oldest first. Each seed is handed out once."""
+        with self._thread_lock:
+            return self._pop(max_seeds)
+
+    def _pop(self, max_seeds: int) -> List[bytes]:
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            head, tail = self._counters()
+            count = min(max_seeds, head - tail)
+            seeds = []
+            for sequence in range(tail, tail + count):
+                slot = self._slot(sequence)
+                seeds.append(bytes(self._buffer[slot:slot + SEED_SIZE]))
+                # Never leave a consumed seed readable in the ring
+                self._buffer[slot:slot + SEED_SIZE] = bytes(SEED_SIZE)
+            COUNTER.pack_into(self._buffer, TAIL_OFFSET, tail + count)
+            return seeds
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def __len__(self) -> int:
+        head, tail = self._counters()
+        return head - tail
+
+    @property
+    def written(self) -> int:
+        """Seeds appended over the ring's lifetime."""
+        return self._counters()[0]
+
+    def close(self):
+        self._buffer.close()
+        os.close(self._fd)
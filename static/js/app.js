@@ -79,9 +79,8 @@ document.addEventListener('DOMContentLoaded', function() {
     // Save settings when they change
     setupSettingsSync();
 
-    // Check system health
-    checkHealth();
-    setInterval(checkHealth, 500); // Check every 500ms for responsive updates
+    // Follow system health as the server pushes changes
+    watchHealth();
 
     // Form submission for random strings
     form.addEventListener('submit', async function(e) {
@@ -237,28 +236,54 @@ document.addEventListener('DOMContentLoaded', function() {
         errorDiv.classList.remove('hidden');
     }
 
+    function showHealth(data) {
+        if (data.status === 'healthy') {
+            const maxAllowed = Math.min(data.available_snapshots, 10);
+            statusSpan.textContent = `System healthy • ${data.available_snapshots} snapshots available • max ${maxAllowed} strings`;
+            statusSpan.className = 'status healthy';
+            
+            // Update max string count based on available snapshots
+            updateMaxStringCount(data.available_snapshots);
+        } else {
+            statusSpan.textContent = 'System unhealthy';
+            statusSpan.className = 'status unhealthy';
+        }
+    }
+
+    function showDisconnected() {
+        statusSpan.textContent = 'Cannot connect to server';
+        statusSpan.className = 'status unhealthy';
+    }
+
     async function checkHealth() {
         try {
             const response = await fetch('/health');
-            const data = await response.json();
-            
-            if (data.status === 'healthy') {
-                const maxAllowed = Math.min(data.available_snapshots, 10);
-                statusSpan.textContent = `System healthy • ${data.available_snapshots} snapshots available • max ${maxAllowed} strings`;
-                statusSpan.className = 'status healthy';
-                
-                // Update max string count based on available snapshots
-                updateMaxStringCount(data.available_snapshots);
-            } else {
-                statusSpan.textContent = 'System unhealthy';
-                statusSpan.className = 'status unhealthy';
-            }
+            showHealth(await response.json());
         } catch (error) {
-            statusSpan.textContent = 'Cannot connect to server';
-            statusSpan.className = 'status unhealthy';
+            showDisconnected();
         }
     }
 
+    function watchHealth() {
+        if (!window.EventSource) {
+            checkHealth();
+            setInterval(checkHealth, 5000);
+            return;
+        }
+        const source = new EventSource('/health/stream');
+        source.onmessage = (event) => showHealth(JSON.parse(event.data));
+        source.onerror = () => {
+            if (source.readyState === EventSource.CLOSED) {
+                // Server refused the stream (too many open), fall back to slow polling
+                checkHealth();
+                setInterval(checkHealth, 5000);
+            } else {
+                // The browser reconnects by itself
+                showDisconnected();
+            }
+        };
+    }
+
     function updateMaxStringCount(availableSnapshots) {
         const maxCount = Math.min(availableSnapshots, 10); // Enforce 10 string limit
         
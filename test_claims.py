@@ -0,0 +1,53 @@
+"""
+Check that concurrent workers drawing entropy from one snapshot directory
+consume every snapshot exactly once.
+
+Run with: python -m pytest test_claims.py
+"""
+import os
+import hashlib
+import multiprocessing
+from pathlib import Path
+from typing import List
+
+PROCESSES = 6
+SNAPSHOTS = 1500
+BATCH = 7
+
+def draw_worker(directory: str, start, batch: int) -> List[str]:
+    """Draw snapshot digests through the generator until the pool is exhausted."""
+    # app reads its configuration at import, so point it at the test directory first
+    os.environ["RANDOMNESS_SOURCE"] = directory
+    os.environ["ENTROPY_SOURCE"] = "snapshots"
+    os.environ["PREFETCH_DEPTH"] = "0"
+    os.environ["TOKEN_QUEUE_DEPTH"] = "0"
+    from app import EntropyExhaustedError, generator
+
+    start.wait()
+    digests = []
+    while True:
+        try:
+            digests.extend(digest.hex() for digest in generator.read_snapshot_digests(batch))
+        except EntropyExhaustedError:
+            return digests
+
+def test_concurrent_draws_use_each_snapshot_once(tmp_path: Path):
+    expected = set()
+    for i in range(SNAPSHOTS):
+        data = os.urandom(256)
+        (tmp_path / f"snapshot_{i:06d}.jpg").write_bytes(data)
+        expected.add(hashlib.sha256(data).hexdigest())
+
+    # Spawn so each worker imports app fresh, with its own index and watcher
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        start = manager.Event()
+        with context.Pool(PROCESSES) as pool:
+            pending = [pool.apply_async(draw_worker, (str(tmp_path), start, BATCH)) for _ in range(PROCESSES)]
+            start.set()
+            results = [result.get(timeout=120) for result in pending]
+
+    digests = [digest for result in results for digest in result]
+    assert len(digests) == len(set(digests)), "a snapshot was consumed more than once"
+    assert set(digests) == expected, "snapshots were skipped or digests do not match their contents"
+    assert not list(tmp_path.rglob("snapshot_*")), "consumed snapshots were left on disk"